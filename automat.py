@@ -1,6 +1,6 @@
 """Automat."""
-from copy import deepcopy
 from state import State
+from digraph import digraph
 
 # -- coding: utf-8 --
 __author__ = 'stepan'
@@ -16,6 +16,8 @@ class Automat:
         self._states = {}
         self._alphabet = {}
         self._start = False
+        # display names of states, which are not named by themselves
+        self._names = {}
 
     def addAlpha(self, char):
         """Add character into alphabet."""
@@ -81,39 +83,57 @@ class Automat:
 
     def getEClose(self, state):
         """Get e-closure of state."""
-        # stack of e transitions, init with current state
-        Q = {state: False}
-        # stack of previous iteration
-        Qbefore = deepcopy(Q)
-        while True:
-            # iterate over states from previous iteration
-            for st in Qbefore:
-                # transition wasn't explored yet
-                if Q[st] is False:
-                    for tran in self._states[st].getRules(''):
-                        if tran not in Q:
-                            # add new states to stack
-                            # and mark them as unexplored
-                            Q[tran] = False
-                    # set actual state as explored
-                    Q[st] = True
-
-            # finish if there weren't any new states added
-            if len(Qbefore) == len(Q):
-                break
-            else:
-                Qbefore = deepcopy(Q)
+        Q = {state: True}
+        stack = [state]
+        while stack:
+            for tran in self._states[stack.pop()].getRules(''):
+                if tran not in Q:
+                    Q[tran] = True
+                    stack.append(tran)
         return Q
 
     def dropERules(self):
-        """Drop all e rules."""
-        for p in self._states:
-            for eRule in self.getEClose(p):
-                rTrans = self._states[eRule].getAllRules()
-                self._states[p].addNonERules(rTrans)
-                if self._states[eRule].isTerm():
-                    self._states[p].setTerm(True)
-            self._states[p].dropERules()
+        """
+        Drop all e rules.
+
+        e-closures of all states are found at once by digraph algorithm,
+        closure is a bit mask over state numbers
+        """
+        names = list(self._states)
+        index = {name: i for i, name in enumerate(names)}
+        eRules = {}
+        initial = {}
+        terminating = 0
+        for i, name in enumerate(names):
+            state = self._states[name]
+            eRules[i] = [index[target] for target in state.getRules('')]
+            initial[i] = 1 << i
+            if state.isTerm():
+                terminating |= 1 << i
+        closures = digraph(range(len(names)), eRules, initial)
+
+        # rules are united from original rules of states in closure
+        rules = [self._states[name].getAllRules() for name in names]
+        for i, name in enumerate(names):
+            closure = closures[i]
+            state = self._states[name]
+            if closure & terminating:
+                state.setTerm(True)
+            if closure == 1 << i:
+                state.dropERules()
+                continue
+            merged = {}
+            while closure:
+                bit = closure & -closure
+                closure ^= bit
+                for char, targets in rules[bit.bit_length() - 1].items():
+                    if char == '':
+                        continue
+                    if char not in merged:
+                        merged[char] = {}
+                    merged[char].update(dict.fromkeys(targets))
+            state.setRules({char: list(targets)
+                            for char, targets in merged.items()})
         return self
 
     def determinate(self):
@@ -121,58 +141,133 @@ class Automat:
         Automat determinization.
 
         (e-rules must be dropped before)
+        states of new automat are numbered from 0 (start state), subset
+        of original states gives display name of the state
+        """
+        states = self._states
+        terminating = {name for name, state in states.items()
+                       if state.isTerm()}
+        allRules = {name: list(state.getAllRules().items())
+                    for name, state in states.items()}
+        start = frozenset((self._start,))
+        subsetIds = {start: 0}
+        subsets = [start]
+
+        newStates = {}
+        # subsets are processed in order of creation
+        for stateId, subset in enumerate(subsets):
+            newState = State()
+            newStates[stateId] = newState
+            if not terminating.isdisjoint(subset):
+                # if any state was final then new is final also
+                newState.setTerm(True)
+            # union of rules of original states by characters
+            moves = {}
+            for origState in subset:
+                for char, targets in allRules[origState]:
+                    if char in moves:
+                        moves[char].update(targets)
+                    else:
+                        moves[char] = set(targets)
+
+            rules = newState.getAllRules()
+            for char, targets in moves.items():
+                targets = frozenset(targets)
+                target = subsetIds.get(targets)
+                if target is None:
+                    # new subset, add it to queue
+                    target = len(subsets)
+                    subsetIds[targets] = target
+                    subsets.append(targets)
+                rules[char] = [target]
+
+        names = {state: self.getName(state) for state in states}
+        self._names = {stateId: '|'.join(sorted(map(names.get, subset)))
+                       for stateId, subset in enumerate(subsets)}
+        self._states = newStates
+        self._start = 0
+        return self
+
+    def minimize(self):
+        """
+        Automat minimization (Hopcroft).
+
+        (automat must be deterministic)
+        missing rule is taken as rule to special sink state, which is never
+        merged with other states, so merged states have rules for the same
+        characters and the automat fails on the same places as before
         """
-        Qnew = {}
-        Qnew[self._start] = True
-        aut = Automat()
-        aut._alphabet = deepcopy(self._alphabet)
-        aut._start = self._start
-        aut.addState(self._start)
-        if self.isTerm(self._start):
-            aut.setTerminating(self._start)
-
-        while True:
-            # get first state from queue
-            state, value = Qnew.popitem()
-            origStates = state.split("|")
-            origRules = {}
-            for origState in origStates:
-                # iterate through states, which is this composed from
-                orgChars = self._states[origState].getAllRules()
-                for char in orgChars:
-                    if char not in origRules:
-                        origRules[char] = []
-                    for target in orgChars[char]:
-                        # getting all rules from original states
-                        if target not in origRules[char]:
-                            origRules[char].append(target)
-
-            for char in origRules:
-                targets = origRules[char]
-                # create new state name
-                newState = '|'.join(sorted(targets))
-                if newState not in aut._states:
-                    # add new state to automat and to stack
-                    # if it's not there
-                    aut.addState(newState)
-                    Qnew[newState] = True
-
-                # add rule, which points to new state
-                aut.addRule(state, char, newState)
-                isTerm = False
-                for target in targets:
-                    if self._states[target].isTerm():
-                        isTerm = True
-
-                if isTerm:
-                    # if any state was final then new is final also
-                    aut.setTerminating(newState)
-
-            if len(Qnew) == 0:
-                # stack is empty, break from cycle
-                break
-
-        self._states = aut._states
+        names = list(self._states)
+        index = {name: i for i, name in enumerate(names)}
+        sink = len(names)
+        alphabet = list(self._alphabet)
+
+        # reversed rules by characters
+        sources = {char: {} for char in alphabet}
+        for name in names:
+            rules = self._states[name].getAllRules()
+            for char in alphabet:
+                if char in rules:
+                    target = index[rules[char][0]]
+                else:
+                    target = sink
+                sources[char].setdefault(target, []).append(index[name])
+        for char in alphabet:
+            sources[char].setdefault(sink, []).append(sink)
+
+        # initial partition - terminating, not terminating and sink
+        blocks = [set(), set(), {sink}]
+        for name in names:
+            blocks[0 if self._states[name].isTerm() else 1].add(index[name])
+        blocks = [block for block in blocks if block]
+        blockOf = [0] * (sink + 1)
+        for b, block in enumerate(blocks):
+            for state in block:
+                blockOf[state] = b
+
+        waiting = set(range(len(blocks)))
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+            for char in alphabet:
+                charSources = sources[char]
+                # states going to splitter by char, by their blocks
+                touched = {}
+                for target in splitter:
+                    for state in charSources.get(target, ()):
+                        touched.setdefault(blockOf[state], []).append(state)
+                for b, states in touched.items():
+                    if len(states) == len(blocks[b]):
+                        continue
+                    # split block, new block gets touched states
+                    newBlock = set(states)
+                    blocks[b] -= newBlock
+                    blocks.append(newBlock)
+                    newB = len(blocks) - 1
+                    for state in newBlock:
+                        blockOf[state] = newB
+                    if b in waiting or len(newBlock) <= len(blocks[b]):
+                        waiting.add(newB)
+                    else:
+                        waiting.add(b)
+
+        # new states are numbered by their first original state
+        blocks = sorted((min(block) for block in blocks
+                         if sink not in block))
+        newIds = {blockOf[first]: i for i, first in enumerate(blocks)}
+        newStates = {}
+        newNames = {}
+        for i, first in enumerate(blocks):
+            state = self._states[names[first]]
+            newState = State()
+            newState.setTerm(state.isTerm())
+            for char, targets in state.getAllRules().items():
+                newState.addRule(char, newIds[blockOf[index[targets[0]]]])
+            newStates[i] = newState
+            newNames[i] = self.getName(names[first])
+
+        self._start = newIds[blockOf[index[self._start]]]
+        self._states = newStates
+        self._names = newNames
         return self
 
     def analyzeString(self, string):
@@ -214,10 +309,24 @@ class Automat:
         else:
             return False
 
+    def getName(self, state):
+        """Get display name of state."""
+        return self._names.get(state, state)
+
     def getAlphabet(self):
         """Get alphabet."""
         return self._alphabet
 
+    def getStates(self):
+        """Get names of all states."""
+        return list(self._states)
+
+    def getTransitions(self, state):
+        """Get target of state by each character, automat is deterministic."""
+        return {char: targets[0]
+                for char, targets in self._states[state].getAllRules().items()
+                if targets}
+
     def isAlpha(self, char):
         """Character is in alphabet."""
         return char in self._alphabet
@@ -247,7 +356,8 @@ class Automat:
         """Convert automat to standard string."""
         ret = '(\n'
 
-        states = sorted(self._states.items(), key=lambda t: t[0])
+        getName = self.getName
+        states = sorted(self._states.items(), key=lambda t: getName(t[0]))
         alphabet = sorted(self._alphabet.items(), key=lambda t: t[0])
 
         ret += "  {"
@@ -256,7 +366,7 @@ class Automat:
         for st in states:
             if i != 0:
                 ret += ", "
-            ret += st[0]
+            ret += getName(st[0])
             i += 1
 
         ret += "},\n  {"
@@ -278,15 +388,16 @@ class Automat:
             keys = st[1].getAllRules()
             keys = sorted(keys.items(), key=lambda t: t[0])
             for key in keys:
-                rules = sorted(key[1])
+                rules = sorted(getName(rule) for rule in key[1])
                 for rule in rules:
                     k = key[0]
 
-                    ret += "    " + st[0] + " '" + k + "' -> " + rule + ";\n"
+                    ret += "    " + getName(st[0]) + " '" + k + "' -> " + \
+                        rule + ";\n"
                     i += 1
 
         ret += "  },\n  "
-        ret += self._start + ",\n"
+        ret += getName(self._start) + ",\n"
 
         ret += "  {"
         i = 0
@@ -294,7 +405,7 @@ class Automat:
             if st[1].isTerm():
                 if i != 0:
                     ret += ", "
-                ret += st[0]
+                ret += getName(st[0])
                 i += 1
         ret += "}\n"
 
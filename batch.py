@@ -0,0 +1,131 @@
+"""Analysis of many input files with one compiled grammar."""
+
+import os
+import sys
+import json
+import time
+import traceback
+import multiprocessing
+from debug_print import err_message
+from lr_table import LRTable
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+# compiled grammar of pool worker process
+_workerCompiled = False
+
+
+def batchInputs(paths, null=False):
+    """
+    Get input file names from paths.
+
+    directories are walked recursively, '-' reads list of files from stdin
+    delimited by new lines (or by NUL characters if null is set)
+    """
+    for path in paths:
+        if path == '-':
+            delimiter = '\0' if null else '\n'
+            for name in sys.stdin.read().split(delimiter):
+                if name != '':
+                    yield name
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def newResult(name):
+    """Get result record of successfully analyzed input."""
+    return {'input': name, 'exit_code': 0, 'error': None,
+            'line': None, 'pos': None, 'time': 0.0}
+
+
+def analyzeInput(compiled, input, name, tree=False):
+    """
+    Analyze input, get result record (with tree if requested).
+
+    input is string or file object
+    """
+    start = time.perf_counter()
+    result = newResult(name)
+    try:
+        derivation = compiled.analyze(input, name, tree)
+        if tree:
+            result['tree'] = str(derivation)
+    except ValueError as e:
+        result['exit_code'] = e.args[1]
+        result['error'] = err_message(e.args[1], e.args[0])
+        result['line'] = e.args[2]
+        result['pos'] = e.args[3]
+    except Exception:
+        result['exit_code'] = 99
+        result['error'] = err_message(99, traceback.format_exc())
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+def analyzeFile(compiled, name):
+    """Read and analyze input file, get result record."""
+    result = newResult(name)
+    try:
+        f = open(name)
+    except OSError as e:
+        # same message as argument parser gives for -i option
+        result['exit_code'] = 10
+        result['error'] = err_message(10, "argument -i/--input: " +
+                                      "can't open '" + name + "': " + str(e))
+        return result
+    except Exception:
+        result['exit_code'] = 99
+        result['error'] = err_message(99, traceback.format_exc())
+        return result
+    with f:
+        # input is read by scanner as analysis goes
+        return analyzeInput(compiled, f, name)
+
+
+def writeResult(result, output):
+    """Write result record as one JSON line."""
+    output.write(json.dumps(result) + '\n')
+
+
+def runBatch(compiled, names, output):
+    """Analyze all input files, write one result line per file."""
+    for name in names:
+        writeResult(analyzeFile(compiled, name), output)
+
+
+def _initWorker(compiled, verify):
+    """Receive compiled grammar once per worker process."""
+    global _workerCompiled
+    _workerCompiled = compiled
+    LRTable.verify = verify
+
+
+def _analyzeFileInWorker(name):
+    """Analyze input file by compiled grammar of worker."""
+    return analyzeFile(_workerCompiled, name)
+
+
+def runParallel(compiled, names, output, jobs, ordered=True, chunksize=8):
+    """
+    Analyze input files by pool of worker processes.
+
+    results are written in order of input files, or as they come
+    if ordered is not set
+    """
+    with multiprocessing.Pool(jobs, _initWorker,
+                              (compiled, LRTable.verify)) as pool:
+        if ordered:
+            results = pool.imap(_analyzeFileInWorker, names, chunksize)
+        else:
+            results = pool.imap_unordered(_analyzeFileInWorker, names,
+                                          chunksize)
+        for result in results:
+            writeResult(result, output)
@@ -0,0 +1,660 @@
+"""
+Scaling benchmarks of tree controlled grammar parser.
+
+python3
+benchmark.py [-h] [-s SIZE [SIZE ...]] [-j N] [--save FILE]
+             [--compare FILE] [CASE [CASE ...]]
+
+results can be saved to JSON file and compared with the next run
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import types
+import tracemalloc
+from grammar import Grammar
+from lr_table import LRRule
+from lr_table import LRGroups
+from eff import EFF
+from automat import Automat
+from compiled_grammar import CompiledGrammar
+from emit_module import emitModule
+from input_parser import InputParser
+from batch import runBatch
+from batch import runParallel
+from profiler import Profiler
+from tree_format import writeText
+from tree_format import treeFormats
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+def chainGrammar(size):
+    """
+    Generate conflict-free grammar with 2 * size + 2 rules.
+
+    S -> N0;  Ni -> 'ai' Ni+1 'bi' | 'ci';  Nsize -> 'x'
+    """
+    grammar = Grammar()
+    grammar.addNonTerminal('S')
+    for i in range(size + 1):
+        grammar.addNonTerminal('N' + str(i))
+    for i in range(size):
+        for prefix in ('a', 'b', 'c'):
+            grammar.addTerminal(prefix + str(i))
+    grammar.addTerminal('x')
+
+    grammar.addRule('S', ['N0'])
+    for i in range(size):
+        n = str(i)
+        grammar.addRule('N' + n, ['a' + n, 'N' + str(i + 1), 'b' + n])
+        grammar.addRule('N' + n, ['c' + n])
+    grammar.addRule('N' + str(size), ['x'])
+    grammar.setStartSymbol('S')
+    return grammar
+
+
+def chainSentence(depth):
+    """Get sentence of chain grammar with nesting depth (< size)."""
+    return " ".join(['a' + str(i) for i in range(depth)] +
+                    ['c' + str(depth)] +
+                    ['b' + str(i) for i in reversed(range(depth))]) + "\n"
+
+
+def layeredGrammar(nonterminals, terminals, alternatives):
+    """
+    Generate conflict-free grammar with layers of nonterminals.
+
+    S -> S N0 | N0;  Ni -> 'tk' Ni+1 for alternatives terminals tk;
+    Nlast -> 't0', sentences of N0 are nonterminals tokens long
+    """
+    alternatives = min(alternatives, terminals)
+    grammar = Grammar()
+    grammar.addNonTerminal('S')
+    for i in range(nonterminals):
+        grammar.addNonTerminal('N' + str(i))
+    for k in range(terminals):
+        grammar.addTerminal('t' + str(k))
+
+    grammar.addRule('S', ['S', 'N0'])
+    grammar.addRule('S', ['N0'])
+    for i in range(nonterminals - 1):
+        for j in range(alternatives):
+            grammar.addRule('N' + str(i), ['t' + str((i + j) % terminals),
+                                           'N' + str(i + 1)])
+    grammar.addRule('N' + str(nonterminals - 1), ['t0'])
+    grammar.setStartSymbol('S')
+    return grammar
+
+
+def layeredSentence(nonterminals, terminals, alternatives, repeats):
+    """Get random sentence of layered grammar, repeats times N0."""
+    alternatives = min(alternatives, terminals)
+    rnd = random.Random(repeats)
+    tokens = []
+    for repeat in range(repeats):
+        for i in range(nonterminals - 1):
+            tokens.append('t' + str((i + rnd.randrange(alternatives)) %
+                                    terminals))
+        tokens.append('t0')
+    return " ".join(tokens) + "\n"
+
+
+# a^n b^n c^n, tree levels controlled by levels automat
+anbncnSource = """
+grammar = (
+  {S, A, B, C},
+  {'a', 'b', 'c'},
+  {
+    S -> A B C;
+    A -> 'a' A;
+    A -> 'a';
+    B -> 'b' B;
+    B -> 'b';
+    C -> 'c' C;
+    C -> 'c';
+  },
+  S
+)
+levels = {
+  'S';
+  'A' 'B' 'C';
+  'a' 'A' 'b' 'B' 'c' 'C';
+  'a' 'b' 'c';
+}
+"""
+
+
+# a^n (lalr table), empty symbols around cycle S -> B, A -> S A make
+# levels states of derivations too many to follow, glr ends by its budget
+cyclicSource = """
+grammar = ({S, A, B}, {'a'}, {
+  S -> A B 'a';
+  S -> B;
+  S -> 'a';
+  S -> 'a' 'a';
+  A -> ;
+  A -> S A;
+  A -> 'a';
+  B -> ;
+  B -> 'a';
+}, S)
+automaton = ({q0}, {
+  q0 'S' -> q0;
+  q0 'A' -> q0;
+  q0 'B' -> q0;
+}, q0, {q0})
+"""
+
+
+# a^n b c^n, b is reduced to X or Y and then Y can be followed by more b,
+# lr engine can only guess at shift-reduce conflict of Y -> b
+ambiguousSource = """
+grammar = ({S, X, Y}, {'a', 'b', 'c'}, {
+  S -> 'a' X 'c';
+  X -> 'a' X 'c';
+  X -> Y;
+  X -> 'b';
+  Y -> 'b' Y;
+  Y -> 'b';
+}, S)
+automaton = ({q0, q1, q2}, {
+  q0 'S' -> q1;
+  q0 'a' -> q0;
+  q0 'X' -> q0;
+  q0 'c' -> q0;
+  q0 'b' -> q2;
+  q0 'Y' -> q2;
+  q2 'b' -> q2;
+}, q0, {q0, q1, q2})
+"""
+
+
+def anbncnLevels(size):
+    """Get a^n b^n c^n source with size more levels making automat bigger."""
+    extra = "".join("  " + " ".join(["'A'", "'B'"] * i + ["'C'"]) + ";\n"
+                    for i in range(1, size + 1))
+    return anbncnSource.replace("  'a' 'b' 'c';\n",
+                                "  'a' 'b' 'c';\n" + extra)
+
+
+def anbncnSentence(n):
+    """Get sentence a^n b^n c^n."""
+    return " ".join(['a'] * n + ['b'] * n + ['c'] * n) + "\n"
+
+
+def epsilonAutomat(size):
+    """
+    Generate automat with size states and e-rules.
+
+    qi -ci-> qi+1 with letter ci = 'a' + i mod 26, e-rules qi -> qi+1
+    inside blocks of 50 states and q50k+49 -> q50k (cycles of e-rules)
+    """
+    automat = Automat()
+    for i in range(26):
+        automat.addAlpha(chr(ord('a') + i))
+    for i in range(size):
+        automat.addState('q' + str(i))
+    automat.setStart('q0')
+    automat.setTerminating('q' + str(size - 1))
+    for i in range(size - 1):
+        automat.addRule('q' + str(i), chr(ord('a') + i % 26),
+                        'q' + str(i + 1))
+        if i % 50 != 49:
+            automat.addRule('q' + str(i), '', 'q' + str(i + 1))
+        else:
+            automat.addRule('q' + str(i), '', 'q' + str(i - 49))
+    return automat
+
+
+def compileGrammar(grammar):
+    """Compile generated grammar as if it was loaded from file."""
+    return CompiledGrammar("grammar = " + str(grammar), '<generated>')
+
+
+def timeIt(func, *args):
+    """Call function, return its result and elapsed time in seconds."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+# phases of profiler measured by generated grammar cases
+phases = ['parse', 'automat', 'table', 'scanner', 'analysis']
+
+
+def phaseTimes(source, input, tree=False):
+    """
+    Compile grammar and analyze input, get compiled grammar and times.
+
+    times of phases are formatted, phase which wasn't run takes 0
+    """
+    Profiler.activate(memory=False)
+    try:
+        compiled = CompiledGrammar(source, '<generated>')
+        compiled.analyze(input, '<generated>', tree)
+    finally:
+        Profiler.deactivate()
+    measured = Profiler.summary()['phases']
+    return compiled, ["{:.4f}".format(measured.get(phase, {}).get('time', 0))
+                      for phase in phases]
+
+
+def phaseColumns(*columns):
+    """Get header columns followed by phase times columns."""
+    return list(columns) + [phase + " s" for phase in phases]
+
+
+def buildGroups(grammar):
+    """Build canonical collection of LR groups (as LRTable does)."""
+    additionalRule = grammar.augment('S*')
+    for i, rule in enumerate(grammar.rules):
+        rule.id = i
+    return LRGroups(grammar, LRRule(additionalRule, 0))
+
+
+def benchGroups(args):
+    """LR groups build time against grammar size."""
+    results.header("rules", "states", "seconds")
+    for size in args.sizes:
+        grammar = chainGrammar(size)
+        groups, seconds = timeIt(buildGroups, grammar)
+        results.row(len(grammar.rules), len(groups.groups),
+                    "{:.4f}".format(seconds))
+
+
+def benchEff(args):
+    """Empty, first and follow sets build time against grammar size."""
+    results.header("rules", "seconds")
+    for size in args.sizes:
+        grammar = chainGrammar(size)
+        grammar.augment('S*')
+        eff, seconds = timeIt(EFF, grammar)
+        results.row(len(grammar.rules), "{:.4f}".format(seconds))
+
+
+def benchAutomat(args):
+    """E-rules elimination, determinization and minimization time."""
+    results.header("states", "drop e", "determ.", "minim.", "states")
+    for size in args.sizes:
+        automat = epsilonAutomat(size)
+        automat, dropTime = timeIt(automat.dropERules)
+        automat, determinateTime = timeIt(automat.determinate)
+        automat, minimizeTime = timeIt(automat.minimize)
+        results.row(size, *["{:.4f}".format(seconds)
+                            for seconds in (dropTime, determinateTime,
+                                            minimizeTime)] +
+                    [len(automat._states)])
+
+
+def benchTree(args):
+    """Analysis time of a^n b^n c^n with levels against input length."""
+    compiled = CompiledGrammar(anbncnSource, '<anbncn>')
+    results.header("tokens", "seconds", "tokens/s")
+    for size in args.sizes:
+        input = anbncnSentence(size)
+        tree, seconds = timeIt(compiled.analyze, input, '<generated>')
+        results.row(3 * size, "{:.4f}".format(seconds),
+                    "{:.0f}".format(3 * size / seconds))
+
+
+def benchLR(args):
+    """Shift and reduce throughput of deterministic a^n b^n c^n grammar."""
+    compiled = CompiledGrammar(anbncnSource.split('levels')[0], '<anbncn>')
+    results.header("tokens", "seconds", "tokens/s")
+    for size in args.sizes:
+        input = anbncnSentence(size)
+        result, seconds = timeIt(compiled.analyze, input, '<generated>',
+                                 False)
+        results.row(3 * size, "{:.4f}".format(seconds),
+                    "{:.0f}".format(3 * size / seconds))
+
+
+def exitCode(compiled, input):
+    """Analyze input without tree, get exit code."""
+    try:
+        compiled.analyze(input, '<generated>', False)
+    except ValueError as e:
+        return e.args[1]
+    return 0
+
+
+def benchGLR(args):
+    """Engines lr and glr on deterministic and ambiguous grammar."""
+    results.header("grammar", "tokens", "lr s", "glr s", "lr exit",
+                   "glr exit")
+    sources = (('anbncn', anbncnSource, anbncnSentence, 'slr'),
+               ('ambiguous', ambiguousSource,
+                lambda n: " ".join(['a'] * n + ['b'] + ['c'] * n) + "\n",
+                'slr'),
+               ('cyclic', cyclicSource,
+                lambda n: " ".join(['a'] * n) + "\n", 'lalr'))
+    for name, source, sentence, mode in sources:
+        compiled = CompiledGrammar(source, '<' + name + '>', mode)
+        for size in args.sizes:
+            input = sentence(size)
+            row = []
+            codes = []
+            for engine in compiled.engines:
+                compiled.engine = engine
+                code, seconds = timeIt(exitCode, compiled, input)
+                row.append("{:.4f}".format(seconds))
+                codes.append(code)
+            results.row(name, len(input.split()), *(row + codes))
+
+
+def benchModule(args):
+    """Analysis by emitted module against analysis by compiled grammar."""
+    results.header("levels", "tokens", "compiled s", "module s")
+    sources = (('no', anbncnSource.split('levels')[0]),
+               ('yes', anbncnSource))
+    for levels, source in sources:
+        compiled = CompiledGrammar(source, '<anbncn>')
+        module = types.ModuleType('anbncn')
+        exec(emitModule(compiled, '<anbncn>'), module.__dict__)
+        for size in args.sizes:
+            input = anbncnSentence(size)
+            result, compiledTime = timeIt(compiled.analyze, input,
+                                          '<generated>', False)
+            result, moduleTime = timeIt(module.analyze, input)
+            results.row(levels, 3 * size, "{:.4f}".format(compiledTime),
+                        "{:.4f}".format(moduleTime))
+
+
+def benchControl(args):
+    """Phases of a^500 b^500 c^500 against control automat size."""
+    input = anbncnSentence(500)
+    results.header(*phaseColumns("levels", "states"))
+    for size in args.sizes:
+        # source grows with square of levels
+        compiled, times = phaseTimes(anbncnLevels(size // 8), input, True)
+        results.row(size // 8, len(compiled.automat._states), *times)
+
+
+def peakMemory(func, *args):
+    """Call function, return peak of memory allocated meanwhile in KiB."""
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak // 1024
+
+
+def benchAccept(args):
+    """Analysis with tree against acceptance only, a^n b^n c^n."""
+    results.header("levels", "tokens", "tree s", "accept s", "tree KiB",
+                   "accept KiB")
+    sources = (('no', anbncnSource.split('levels')[0]),
+               ('yes', anbncnSource))
+    for levels, source in sources:
+        compiled = CompiledGrammar(source, '<anbncn>')
+        for size in args.sizes:
+            input = anbncnSentence(size)
+            row = []
+            for tree in (True, False):
+                result, seconds = timeIt(compiled.analyze, input,
+                                         '<generated>', tree)
+                row.append("{:.4f}".format(seconds))
+            for tree in (True, False):
+                row.append(peakMemory(compiled.analyze, input,
+                                      '<generated>', tree))
+            results.row(levels, 3 * size, *row)
+
+
+def benchParallel(args):
+    """Batch throughput against number of worker processes."""
+    compiled = compileGrammar(chainGrammar(50))
+    inputs = 400
+    with tempfile.TemporaryDirectory() as directory:
+        names = []
+        for i in range(inputs):
+            names.append(os.path.join(directory, str(i) + '.in'))
+            with open(names[-1], 'w') as f:
+                f.write(chainSentence(40))
+
+        results.header("jobs", "inputs/s")
+        jobs = 1
+        while jobs <= args.jobs:
+            with open(os.devnull, 'w') as output:
+                if jobs == 1:
+                    result, seconds = timeIt(runBatch, compiled, names,
+                                             output)
+                else:
+                    result, seconds = timeIt(runParallel, compiled, names,
+                                             output, jobs)
+            results.row(jobs, "{:.1f}".format(inputs / seconds))
+            jobs *= 2
+
+
+def scanAll(scanner, input):
+    """Read all tokens of input."""
+    inputParser = InputParser(input, scanner)
+    tokens = 0
+    while inputParser.getToken() != '':
+        tokens += 1
+    return tokens
+
+
+def benchScanner(args):
+    """Input scanning time against input size (tokens)."""
+    scanner = compileGrammar(chainGrammar(50)).scanner
+    results.header("tokens", "seconds", "tokens/s")
+    for size in args.sizes:
+        # sentences of growing depth, one per line
+        input = "".join(chainSentence(i % 50) for i in range(size))
+        tokens, seconds = timeIt(scanAll, scanner, input)
+        results.row(tokens, "{:.4f}".format(seconds),
+                    "{:.0f}".format(tokens / seconds))
+
+
+def benchNonterminals(args):
+    """Phases of layered grammar against number of nonterminals."""
+    results.header(*phaseColumns("nonterms", "rules"))
+    for size in args.sizes:
+        grammar = layeredGrammar(size, 10, 3)
+        compiled, times = phaseTimes("grammar = " + str(grammar),
+                                     layeredSentence(size, 10, 3, 10))
+        results.row(size, len(grammar.rules), *times)
+
+
+def benchTerminals(args):
+    """Phases of layered grammar against number of terminals."""
+    results.header(*phaseColumns("terms", "rules"))
+    for size in args.sizes:
+        grammar = layeredGrammar(10, size, 3)
+        compiled, times = phaseTimes("grammar = " + str(grammar),
+                                     layeredSentence(10, size, 3, 10))
+        results.row(size, len(grammar.rules), *times)
+
+
+def benchRules(args):
+    """Phases of layered grammar against number of rules of nonterminal."""
+    results.header(*phaseColumns("alts", "rules"))
+    for size in args.sizes:
+        # as many terminals as alternatives, to keep grammar conflict-free
+        alternatives = max(1, size // 4)
+        grammar = layeredGrammar(10, alternatives, alternatives)
+        compiled, times = phaseTimes(
+            "grammar = " + str(grammar),
+            layeredSentence(10, alternatives, alternatives, 10))
+        results.row(alternatives, len(grammar.rules), *times)
+
+
+def benchInput(args):
+    """Phases of layered grammar against input length."""
+    source = "grammar = " + str(layeredGrammar(10, 10, 3))
+    results.header(*phaseColumns("tokens"))
+    for size in args.sizes:
+        compiled, times = phaseTimes(source,
+                                     layeredSentence(10, 10, 3, size * 10))
+        results.row(size * 100, *times)
+
+
+def benchDepth(args):
+    """Phases of chain grammar against depth of derivation tree."""
+    results.header(*phaseColumns("depth", "rules"))
+    for size in args.sizes:
+        grammar = chainGrammar(size)
+        compiled, times = phaseTimes("grammar = " + str(grammar),
+                                     chainSentence(size - 1), True)
+        results.row(size, len(grammar.rules), *times)
+
+
+def benchLevels(args):
+    """Phases of a^n b^n c^n under levels automat against input length."""
+    results.header(*phaseColumns("tokens"))
+    for size in args.sizes:
+        compiled, times = phaseTimes(anbncnSource, anbncnSentence(size),
+                                     True)
+        results.row(3 * size, *times)
+
+
+def benchRender(args):
+    """Printing time of chain grammar tree in each format against depth."""
+    formats = [('text', writeText)] + sorted(treeFormats.items())
+    results.header("depth", *[name + " s" for name, write in formats])
+    for size in args.sizes:
+        compiled = compileGrammar(chainGrammar(size))
+        tree = compiled.analyze(chainSentence(size - 1), '<generated>')
+        results.row(size, *["{:.4f}".format(timeIt(write, tree.stack,
+                                                    io.StringIO())[1])
+                            for name, write in formats])
+
+
+class Results:
+    """
+    Rows printed by benchmark cases.
+
+    rows are kept to be saved, values differing from previous run are
+    followed by previous value in brackets
+    """
+
+    def __init__(self, previous=False):
+        """Initialization, previous - saved results to compare with."""
+        self.cases = {}
+        self.previous = previous or {}
+        self.case = False
+
+    def start(self, case):
+        """Start rows of benchmark case."""
+        self.case = case
+
+    def header(self, *columns):
+        """Print header of case rows."""
+        self.cases[self.case] = {'columns': list(columns), 'rows': []}
+        print("\t".join(columns))
+
+    def row(self, *values):
+        """Print row, compared with row of previous run on the same place."""
+        values = [str(value) for value in values]
+        rows = self.cases[self.case]['rows']
+        previous = self.previous.get(self.case, {}).get('rows', [])
+        line = values
+        if len(rows) < len(previous) and previous[len(rows)][0] == values[0]:
+            line = [value if value == old else value + " (" + old + ")"
+                    for value, old in zip(values, previous[len(rows)])]
+        rows.append(values)
+        print("\t".join(line))
+
+    def save(self, path, args):
+        """Save rows of all cases with environment to JSON file."""
+        with open(path, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'sizes': args.sizes,
+                       'cases': self.cases}, f, indent=1)
+            f.write('\n')
+
+
+# results of current run
+results = Results()
+
+cases = {
+    'accept': benchAccept,
+    'automat': benchAutomat,
+    'control': benchControl,
+    'depth': benchDepth,
+    'glr': benchGLR,
+    'groups': benchGroups,
+    'input': benchInput,
+    'levels': benchLevels,
+    'lr': benchLR,
+    'module': benchModule,
+    'nonterminals': benchNonterminals,
+    'eff': benchEff,
+    'parallel': benchParallel,
+    'render': benchRender,
+    'rules': benchRules,
+    'scanner': benchScanner,
+    'terminals': benchTerminals,
+    'tree': benchTree,
+}
+
+
+def main():
+    """Main function."""
+    argp = argparse.ArgumentParser(description='TCGP scaling benchmarks')
+    argp.add_argument('case',
+                      nargs='*',
+                      metavar='CASE',
+                      choices=[[]] + sorted(cases),
+                      help='Benchmarks to run: ' + ', '.join(sorted(cases)) +
+                      ' (all if not present)'
+                      )
+    argp.add_argument('-s', '--sizes',
+                      nargs='+',
+                      type=int,
+                      default=[100, 200, 400, 800, 1600],
+                      metavar='SIZE',
+                      help='Grammar sizes to measure'
+                      )
+    argp.add_argument('-j', '--jobs',
+                      type=int,
+                      default=max(2, os.cpu_count()),
+                      metavar='N',
+                      help='Maximal number of worker processes'
+                      )
+    argp.add_argument('--save',
+                      default=False,
+                      metavar='FILE',
+                      help='Save results to JSON file'
+                      )
+    argp.add_argument('--compare',
+                      default=False,
+                      metavar='FILE',
+                      help='Compare with results saved to JSON file'
+                      )
+    args = argp.parse_args()
+
+    global results
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous['sizes'] != args.sizes:
+            print("# sizes differ from compared results, " +
+                  "rows may not match\n")
+        results = Results(previous['cases'])
+
+    for case in args.case or sorted(cases):
+        print("# " + case + ": " + cases[case].__doc__)
+        results.start(case)
+        cases[case](args)
+        print()
+
+    if args.save:
+        results.save(args.save, args)
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
@@ -0,0 +1,114 @@
+"""Grammar compiled for analysis of input strings."""
+
+from parser import Parser
+from lr_table import LRTable
+from glr import GLR
+from input_parser import Scanner
+from input_parser import InputParser
+from debug_print import debug_print
+from profiler import Profiler
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class CompiledGrammar:
+    """Grammar with LR table, control automat and input scanner."""
+
+    # analysis engines:
+    #  - lr:  deterministic, conflicts are solved by tree or guessed
+    #  - glr: all alternatives of conflicts are followed
+    engines = ('lr', 'glr')
+    engine = 'lr'
+
+    def __init__(self, source, name, mode='slr'):
+        """
+        Compile grammar file content.
+
+        raises ValueError(message, exit code), name of the file is used
+        in error messages
+        """
+        self.mode = mode
+
+        # parse input grammar
+        grammarParser = Parser()
+        try:
+            with Profiler.phase('parse'):
+                grammarParser.parse(source)
+        except ValueError as e:
+            # there is an syntax error in input grammar
+            # add line number and filename
+            raise ValueError(e.args[0] +
+                             "\n(file: '" + name + "', line: " +
+                             str(grammarParser.getLine()) + ", pos: " +
+                             str(grammarParser.getPos()) + ")", e.args[1])
+
+        # get grammar, automat and precednece table from parser
+        self.grammar = grammarParser.getGrammar()
+        debug_print('grammar', self.grammar, '\n')
+        self.automat = grammarParser.getAutomat()
+        self.precedence = grammarParser.getPrecedence()
+
+        if self.precedence is not False:
+            debug_print('precedence', self.precedence)
+
+        if self.automat:
+            with Profiler.phase('automat'):
+                self._prepareAutomat()
+            debug_print('automat', self.automat)
+
+        # build lr table
+        with Profiler.phase('table'):
+            self.table = LRTable(self.grammar, self.precedence,
+                                 self.automat, mode)
+
+        with Profiler.phase('scanner'):
+            self.scanner = Scanner(self.grammar.terminals)
+        debug_print('scanner', self.scanner.aut, '\n')
+
+    def _prepareAutomat(self):
+        """Add state for lowest level of the tree and minimize."""
+        automat = self.automat
+        # add new state for lowest level of the tree
+        # there can be all terminals
+        startState = automat.getStart()
+        newState = "t*"
+        automat.addState(newState)
+        automat.setTerminating(newState)
+        for term in self.grammar.terminals:
+            automat.addRule(startState, term, newState)
+            automat.addRule(newState, term, newState)
+
+        # determinate and minimize automat
+        with Profiler.phase('drop_e_rules'):
+            automat.dropERules()
+        with Profiler.phase('determinate'):
+            automat.determinate()
+        with Profiler.phase('minimize'):
+            automat.minimize()
+
+    def analyze(self, input, name, tree=True, trace=False):
+        """
+        Analyze input string, return derivation tree.
+
+        input is string, file object or iterable of string chunks,
+        raises ValueError(message, exit code, line, pos), name of the file
+        is used in error messages, if tree is not set, tree isn't built
+        and True is returned, trace - ParseTrace getting events of analysis
+        """
+        with Profiler.phase('input'):
+            scanner = InputParser(input, self.scanner)
+        analysis = GLR(self.table) if self.engine == 'glr' else self.table
+        try:
+            with Profiler.phase('analysis'):
+                return analysis.analyzeSymbols(scanner.getToken, tree, trace)
+        except ValueError as e:
+            # error in input string
+            lineNum = scanner.getLine()
+            charPos = scanner.getPos()
+            raise ValueError(e.args[0] +
+                             "\n(file: '" + name + "', line: " +
+                             str(lineNum) + ", pos: " +
+                             str(charPos) + ")", e.args[1], lineNum, charPos)
@@ -18,14 +18,24 @@ err_messages = {
 }
 
 
+def err_prefix(exit_code):
+    """Get error message prefix for exit code."""
+    if str(exit_code) in err_messages:
+        return err_messages[str(exit_code)] + ": "
+    else:
+        return "UNDEFINED ERR " + str(exit_code) + " : "
+
+
+def err_message(exit_code, message):
+    """Get error message, as printed by err_print."""
+    return err_prefix(exit_code) + message
+
+
 def err_print(exit_code, *args, **kwargs):
     """Print error message to stderr and exit with err_code."""
     if not sys.stdout.closed:
         sys.stdout.flush()
-    if str(exit_code) in err_messages:
-        sys.stderr.write(err_messages[str(exit_code)] + ": ")
-    else:
-        sys.stderr.write("UNDEFINED ERR " + str(exit_code) + " : ")
+    sys.stderr.write(err_prefix(exit_code))
     print(*args, file=sys.stderr, **kwargs)
     sys.exit(exit_code)
 
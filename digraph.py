@@ -0,0 +1,61 @@
+"""Digraph algorithm."""
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+def digraph(nodes, relation, initial):
+    """
+    Digraph algorithm (DeRemer and Pennello).
+
+    F(x) = initial(x) | F(y) for all y related to x, sets are bit masks
+    and nodes in one strongly connected component get same set
+    """
+    INFINITY = len(nodes) + 1
+    depth = {x: 0 for x in nodes}
+    result = {}
+    stack = []
+
+    for start in nodes:
+        if depth[start] != 0:
+            continue
+        # iterative traversal, work items are node, its depth on stack
+        # and iterator over related nodes
+        stack.append(start)
+        depth[start] = len(stack)
+        result[start] = initial.get(start, 0)
+        work = [(start, len(stack), iter(relation.get(start, ())))]
+        while work:
+            x, d, related = work[-1]
+            descended = False
+            for y in related:
+                if depth[y] == 0:
+                    # traverse y first, then come back to x
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    result[y] = initial.get(y, 0)
+                    work.append((y, len(stack), iter(relation.get(y, ()))))
+                    descended = True
+                    break
+                depth[x] = min(depth[x], depth[y])
+                result[x] |= result[y]
+            if descended:
+                continue
+
+            work.pop()
+            if depth[x] == d:
+                # x is root of strongly connected component
+                while True:
+                    top = stack.pop()
+                    depth[top] = INFINITY
+                    result[top] = result[x]
+                    if top == x:
+                        break
+            if work:
+                # propagate to parent
+                parent = work[-1][0]
+                depth[parent] = min(depth[parent], depth[x])
+                result[parent] |= result[x]
+    return result
@@ -1,135 +1,159 @@
 """Empty, first and follow."""
 
+from digraph import digraph
+
 # -- coding: utf-8 --
 __author__ = 'stepan'
 __license__ = 'MIT'
 __version__ = '1.0'
 
 
-class PredictRow:
-    """Represents 3 columns (Empty, First, Follow)."""
-
-    def __init__(self):
-        """Initialization."""
-        self.empty = False
-        self.first = set()
-        self.follow = set()
-
-    def __str__(self):
-        """To string."""
-        s = ""
-        s += str(self.empty) + " "
-        s += str(self.first) + " "
-        s += str(self.follow)
-        return s
-
-
 class EFF:
-    """Empty, first and follow object."""
+    """
+    Empty, first and follow object.
+
+    sets are bit masks over symbol ids of grammar, end symbol ($) is bit 0
+    """
     def __init__(self, grammar):
         """Initialization."""
-        self._ptable = {}
-        # predict sets
-
-        ptable = self._ptable
-
-        for nonterminal in grammar.nonterminals:
-            # init ptable
-            ptable[nonterminal] = PredictRow()
+        self.grammar = grammar
+        symbolIds = grammar.symbolIds
+        nonterminals = [symbolIds[symbol] for symbol in grammar.nonterminals]
 
+        self._empty = [False] * len(grammar.symbolNames)
+        self._first = [0] * len(grammar.symbolNames)
         for terminal in grammar.terminals:
-            # init ptable
-            ptable[terminal] = PredictRow()
             # first of terminal is it self
-            ptable[terminal].first.add(terminal)
-
-        # Empty and First algorithm
-
-        while True:
-            change = False      # remember if anything changed
-            for rule in grammar.rules:
-                ruleRow = ptable[rule.leftSide]
-                for i, symbol in enumerate(rule.rightSide):
-                    firstLength = len(ruleRow.first)
-                    # add first of symbol to rule's first
-                    ruleRow.first.update(ptable[symbol].first)
-                    if firstLength != len(ruleRow.first):
-                        # set is longer then before -> something has changed
-                        change = True
-                    if not ptable[symbol].empty:
-                        # this symbol can't be erased -> stop
-                        break
-                    elif i == (len(rule.rightSide) - 1):
-                        # all symbols can be erased
-                        if not ruleRow.empty:
-                            ruleRow.empty = True
-                            change = True
-
-                if len(rule.rightSide) == 0:
-                    # epsilon rule
-                    if ruleRow.empty is not True:
-                        ruleRow.empty = True
-                        change = True
-
-            if not change:
-                break
-
-        # Follow algorithm
+            self._first[symbolIds[terminal]] = 1 << symbolIds[terminal]
+
+        rules = [(symbolIds[rule.leftSide],
+                  [symbolIds[symbol] for symbol in rule.rightSide])
+                 for rule in grammar.rules]
+
+        # Empty algorithm - rule is erasable when all its symbols are,
+        # count not erasable symbols and propagate by worklist
+        remaining = []
+        usedIn = {}
+        worklist = []
+        for r, (left, right) in enumerate(rules):
+            remaining.append(len(right))
+            for symbol in right:
+                if symbol not in usedIn:
+                    usedIn[symbol] = []
+                usedIn[symbol].append(r)
+            if len(right) == 0:
+                worklist.append(left)
+        for symbol in worklist:
+            if self._empty[symbol]:
+                continue
+            self._empty[symbol] = True
+            for r in usedIn.get(symbol, ()):
+                remaining[r] -= 1
+                if remaining[r] == 0:
+                    worklist.append(rules[r][0])
+
+        # First algorithm - left side gets first of erasable prefix
+        # of the rule and next symbol, solved in dependency order
+        firstInit = {}
+        firstRel = {symbol: [] for symbol in nonterminals}
+        for left, right in rules:
+            for symbol in right:
+                if symbol not in firstRel:
+                    # terminal
+                    firstInit[left] = firstInit.get(left, 0) | \
+                        self._first[symbol]
+                else:
+                    firstRel[left].append(symbol)
+                if not self._empty[symbol]:
+                    break
+        for symbol, first in digraph(nonterminals, firstRel,
+                                     firstInit).items():
+            self._first[symbol] = first
+
+        # first and empty of every rule suffix
+        self._suffix = {}
+        for rule, (left, right) in zip(grammar.rules, rules):
+            first = [0] * (len(right) + 1)
+            empty = [True] * (len(right) + 1)
+            for i in range(len(right) - 1, -1, -1):
+                symbol = right[i]
+                if self._empty[symbol]:
+                    first[i] = self._first[symbol] | first[i + 1]
+                    empty[i] = empty[i + 1]
+                else:
+                    first[i] = self._first[symbol]
+                    empty[i] = False
+            self._suffix[rule] = (first, empty)
+
+        # Follow algorithm - symbol gets first of symbols following it
+        # and follow of left side, if following symbols can be erased
 
         # add end symbol ($) to follow of start symbol
-        ptable[grammar.start].follow.add('')
-
-        while True:
-            change = False
-            for rule in grammar.rules:
-                ruleSymbols = rule.rightSide
-                for i, symbol in enumerate(ruleSymbols):
-                    if grammar.isTerm(symbol):
-                        continue
-                    symbolSet = ptable[symbol].follow
-                    length = len(symbolSet)
-
-                    # symbols following this one
-                    rightSymbols = ruleSymbols[i + 1:]
-                    symbolSet.update(self.first(rightSymbols))
-                    if self.empty(rightSymbols):
-                        # following symbols can be removed
-                        symbolSet.update(
-                            ptable[rule.leftSide].follow)
-
-                    if length != len(symbolSet):
-                        change = True
-            if not change:
-                break
+        followInit = {symbolIds[grammar.start]: 1}
+        followRel = {symbol: [] for symbol in nonterminals}
+        for rule, (left, right) in zip(grammar.rules, rules):
+            first, empty = self._suffix[rule]
+            for i, symbol in enumerate(right):
+                if symbol not in followRel:
+                    # terminal
+                    continue
+                followInit[symbol] = followInit.get(symbol, 0) | first[i + 1]
+                if empty[i + 1] and left != symbol:
+                    followRel[symbol].append(left)
+        self._follow = [0] * len(grammar.symbolNames)
+        for symbol, follow in digraph(nonterminals, followRel,
+                                      followInit).items():
+            self._follow[symbol] = follow
+        self._followSets = {}
 
     def empty(self, symbols):
         """Get empty of symbols."""
+        symbolIds = self.grammar.symbolIds
         for symbol in symbols:
-            if not self._ptable[symbol].empty:
+            if not self._empty[symbolIds[symbol]]:
                 return False
         return True
 
     def first(self, symbols):
         """Get first of symbols."""
-        first = set()
+        return self.grammar.symbolsOf(self.firstMask(symbols))
+
+    def firstMask(self, symbols):
+        """Get first of symbols as bit mask."""
+        symbolIds = self.grammar.symbolIds
+        first = 0
         for symbol in symbols:
-            first.update(self._ptable[symbol].first)
-            if not self.empty([symbol]):
+            first |= self._first[symbolIds[symbol]]
+            if not self._empty[symbolIds[symbol]]:
                 break
         return first
 
+    def emptySuffix(self, rule, i):
+        """Get empty of rule right side symbols from i-th."""
+        return self._suffix[rule][1][i]
+
     def follow(self, symbol):
         """Get follow of symbol."""
-        return self._ptable[symbol].follow
+        if symbol not in self._followSets:
+            self._followSets[symbol] = self.grammar.symbolsOf(
+                self.followMask(symbol))
+        return self._followSets[symbol]
+
+    def followMask(self, symbol):
+        """Get follow of symbol as bit mask."""
+        return self._follow[self.grammar.symbolIds[symbol]]
 
     def __str__(self):
         """To string."""
+        grammar = self.grammar
         s = ""
         s += "\tempty\tfirst\tfollow\n"
-        for symb in self._ptable:
-            row = self._ptable[symb]
-            s += symb + "\t" + str(row.empty) + "\t"
-            s += "{" + ", ".join(symb for symb in row.first) + "}\t"
+        for symb in grammar.nonterminals + grammar.terminals:
+            symbolId = grammar.symbolIds[symb]
+            s += symb + "\t" + str(self._empty[symbolId]) + "\t"
+            s += "{" + ", ".join(grammar.symbolsOf(
+                self._first[symbolId])) + "}\t"
             s += "{" + ", ".join(symb if symb != '' else '$'
-                                 for symb in row.follow) + "}\n"
+                                 for symb in grammar.symbolsOf(
+                                     self._follow[symbolId])) + "}\n"
         return s
@@ -0,0 +1,151 @@
+"""
+Check emitted parser modules against analysis by compiled grammar.
+
+python3
+emit_check.py [-h] [-n N] [--seed SEED]
+
+example grammars of benchmark.py are compiled and emitted as modules,
+valid sentences and random changes of them must get the same verdict and
+error message from both, module gets input as string, file and chunks
+"""
+
+import io
+import sys
+import types
+import random
+import argparse
+from compiled_grammar import CompiledGrammar
+from emit_module import emitModule
+from benchmark import chainGrammar
+from benchmark import chainSentence
+from benchmark import layeredGrammar
+from benchmark import layeredSentence
+from benchmark import anbncnSource
+from benchmark import anbncnLevels
+from benchmark import anbncnSentence
+from benchmark import ambiguousSource
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+def ambiguousSentence(n):
+    """Get sentence a^n b^k c^n of ambiguous grammar."""
+    return " ".join(['a'] * (n + 1) + ['b'] * (n % 3 + 1) +
+                    ['c'] * (n + 1)) + "\n"
+
+
+# name, grammar source and sentence of size
+examples = [
+    ('chain', "grammar = " + str(chainGrammar(20)),
+     lambda n: chainSentence(n % 20)),
+    ('layered', "grammar = " + str(layeredGrammar(5, 4, 3)),
+     lambda n: layeredSentence(5, 4, 3, n % 7 + 1)),
+    ('anbncn', anbncnSource, lambda n: anbncnSentence(n % 6 + 1)),
+    ('anbncn-lr', anbncnSource.split('levels')[0],
+     lambda n: anbncnSentence(n % 6 + 1)),
+    ('anbncn-levels', anbncnLevels(3), lambda n: anbncnSentence(n % 6 + 1)),
+    ('ambiguous', ambiguousSource, ambiguousSentence),
+]
+
+
+def changed(sentence, terminals, rnd):
+    """Get sentence with random tokens removed, added or swapped."""
+    tokens = sentence.split()
+    for i in range(rnd.randint(1, 3)):
+        change = rnd.randrange(5)
+        position = rnd.randint(0, len(tokens))
+        if change == 0 and tokens:
+            del tokens[min(position, len(tokens) - 1)]
+        elif change == 1:
+            tokens.insert(position, rnd.choice(terminals))
+        elif change == 2 and len(tokens) > 1:
+            i = rnd.randrange(len(tokens) - 1)
+            tokens[i], tokens[i + 1] = tokens[i + 1], tokens[i]
+        elif change == 3:
+            tokens = tokens[:position]
+        else:
+            # char out of grammar or prefix of terminal, which isn't one
+            tokens.insert(position, rnd.choice(
+                ['?', 'zz'] + [t[:-1] for t in terminals if len(t) > 1]))
+    separators = [rnd.choice([' ', '  ', '\n', '\t ']) for t in tokens]
+    return "".join([t + s for t, s in zip(tokens, separators)])
+
+
+def chunks(input, rnd):
+    """Split input into chunks of random length."""
+    parts = []
+    while input:
+        size = rnd.randint(1, 8)
+        parts.append(input[:size])
+        input = input[size:]
+    return parts
+
+
+def verdict(analyze, input):
+    """Get exit code and message of analysis, 0 and '' if accepted."""
+    try:
+        analyze(input)
+    except ValueError as e:
+        return e.args[1], e.args[0]
+    return 0, ''
+
+
+def checkExample(name, source, sentence, count, rnd):
+    """Compare analyses of example grammar, get numbers of inputs and diffs."""
+    compiled = CompiledGrammar(source, '<' + name + '>')
+    module = types.ModuleType(name)
+    exec(emitModule(compiled, '<' + name + '>'), module.__dict__)
+    # files are read in short parts, tokens continue over their ends
+    module.InputParser.chunkSize = 3
+    terminals = sorted(compiled.grammar.terminals)
+    inputs = ['', ' \n']
+    for n in range(count):
+        inputs.append(sentence(n))
+        inputs.append(changed(sentence(n), terminals, rnd))
+    diffs = 0
+    for input in inputs:
+        expected = verdict(lambda i: compiled.analyze(i, '<input>', False),
+                           input)
+        got = [verdict(lambda i: module.analyze(i, '<input>'), input),
+               verdict(lambda i: module.analyze(io.StringIO(i), '<input>'),
+                       input),
+               verdict(lambda i: module.analyze(chunks(i, rnd), '<input>'),
+                       input)]
+        if any([result != expected for result in got]):
+            diffs += 1
+            if diffs <= 3:
+                print("  input " + repr(input) + "\n  compiled: " +
+                      repr(expected) + "\n  module:   " + repr(got))
+    return len(inputs), diffs
+
+
+def main():
+    """Main function."""
+    argp = argparse.ArgumentParser(description='Check emitted modules')
+    argp.add_argument('-n',
+                      type=int,
+                      default=200,
+                      metavar='N',
+                      help='Sentences per grammar, each also changed'
+                      )
+    argp.add_argument('--seed',
+                      type=int,
+                      default=0,
+                      help='Seed of random changes'
+                      )
+    args = argp.parse_args()
+
+    rnd = random.Random(args.seed)
+    failed = False
+    for name, source, sentence in examples:
+        inputs, diffs = checkExample(name, source, sentence, args.n, rnd)
+        print(name + ": " + str(inputs) + " inputs, " + str(diffs) +
+              " differ")
+        failed = failed or diffs > 0
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
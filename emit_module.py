@@ -0,0 +1,341 @@
+"""Standalone parser module specialized to one compiled grammar."""
+
+import inspect
+from tree import LevelStates
+from tree import AutomatMaps
+from tree import automatMaps
+from input_parser import InputParser
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+_HEADER = '''"""
+Parser of grammar {name}.
+
+Generated by tcgp.py --emit-module, do not edit.
+
+python3
+{module} [-h] [INPUT]
+
+analyze(input, name) checks that input belongs to the grammar, returns True
+or raises ValueError(message, exit code, line, pos), exit codes are the same
+as of tcgp.py
+"""
+
+import re
+import sys
+import argparse
+import traceback
+from array import array
+
+'''
+
+_RUNTIME = '''
+
+# compiled table cell - operation in two lowest bits, argument in the rest
+ERROR = 0
+SHIFT = 1       # shift or goto, argument is state
+REDUCE = 2      # argument is rule id
+SPECIAL = 3     # argument 0 is end point, n > 0 is n-th conflict
+ACCEPT = SPECIAL
+
+err_messages = {1: 'NOT_IN_GRAMMAR', 2: 'NONDETERM_ERROR',
+                10: 'ARGUMENTS_ERROR', 99: 'INTERNAL_ERROR'}
+'''
+
+_CONTROL = '''
+
+# maps of symbols, maps composed from them are kept by each analysis
+AUTOMAT_MAPS = AutomatMaps(START, SYMBOL_STATES)
+
+
+class Control:
+    """Automat states of levels of trees on stack."""
+
+    def __init__(self):
+        """Initialization."""
+        self.levels = []
+        self.maps = AUTOMAT_MAPS.copy()
+
+    def pushSymbol(self, symbol):
+        """Push new symbol."""
+        levels = self.maps.symbolLevels(symbol, not self.levels)
+        if levels is False:
+            raise ValueError("Pushed symbol '" + SYMBOLS[symbol] + "' is " +
+                             "not accepted by automat.", 1)
+        self.levels.append(levels)
+
+    def tryApplyRule(self, ruleId):
+        """Get levels of new tree, False if automat doesn't accept them."""
+        treeIndex = len(self.levels) - RULE_LENGTHS[ruleId]
+        return self.maps.mergeLevels(self.levels[treeIndex:],
+                                     RULE_LEFT[ruleId], treeIndex == 0)
+
+    def applyRule(self, ruleId, levels=False):
+        """Replace levels of right side of the rule, False if rejected."""
+        if levels is False:
+            levels = self.tryApplyRule(ruleId)
+            if levels is False:
+                return False
+        del self.levels[len(self.levels) - RULE_LENGTHS[ruleId]:]
+        self.levels.append(levels)
+        return True
+
+    def checkTree(self):
+        """Check if all levels are in terminating state."""
+        if self.levels:
+            level = self.maps.failedLevel(self.levels[0],
+                                          TERMINATING.__contains__)
+            if level is not False:
+                raise ValueError('Level ' + str(level) +
+                                 ' is not in final state.', 1)
+'''
+
+_ANALYSIS = '''
+
+def solveConflict(control, conflict, state, token):
+    """Get table cell for conflict and whether it was just guessed."""
+    shift, reduces = conflict
+    position = "[" + str(state) + "," + SYMBOLS[token] + "]"
+    if not control:
+        raise ValueError("Unhandled conflict in lr table on position " +
+                         position + ", ", 2)
+    possibleRules = []
+    for ruleId in reduces:
+        levels = control.tryApplyRule(ruleId)
+        if levels is not False:
+            possibleRules.append((ruleId, levels))
+
+    if len(possibleRules) > 1:
+        raise ValueError("Unhandled reduce-reduce conflict in lr table " +
+                         "on position " + position + ", got theese " +
+                         "options:\\n" + "\\n".join([RULES[ruleId] for
+                                                   ruleId, levels in
+                                                   possibleRules]), 2)
+    elif len(possibleRules) == 1:
+        ruleId, levels = possibleRules[0]
+        control.applyRule(ruleId, levels)
+        # reduce is guessed, when shift is possible too
+        return (ruleId << 2) | REDUCE, shift is not False
+    elif shift is False:
+        raise ValueError("No rule fits to tree for reduce-reduce " +
+                         "conflict in lr table, on position " + position)
+    control.pushSymbol(token)
+    return (shift << 2) | SHIFT, False
+
+
+def analyzeTokens(getToken):
+    """Analyze tokens, raises ValueError(message, exit code)."""
+    table = TABLE
+    width = WIDTH
+    ruleLeft = RULE_LEFT
+    ruleLengths = RULE_LENGTHS
+    control = Control() if CONTROL else False
+
+    states = [0]
+    state = 0
+    token = getToken()
+    err = False
+    # exit code of error, 2 after nondeterministic step
+    exitCode = 1
+    try:
+        while True:
+            cell = table[state * width + token]
+            if cell == ERROR:
+                raise ValueError("No rule for token '" + SYMBOLS[token] +
+                                 "' in state " + str(state))
+            if cell == ACCEPT:
+                break
+
+            operation = cell & 3
+            if operation == SPECIAL:
+                cell, guessed = solveConflict(
+                    control, CONFLICTS[(cell >> 2) - 1], state, token)
+                if guessed:
+                    exitCode = 2
+                operation = cell & 3
+            elif control:
+                if operation == SHIFT:
+                    control.pushSymbol(token)
+                elif not control.applyRule(cell >> 2):
+                    raise ValueError("Rule " + RULES[cell >> 2] +
+                                     " can't be used, because " +
+                                     "of tree conflict.")
+
+            if operation == SHIFT:
+                state = cell >> 2
+                states.append(state)
+                token = getToken()
+            else:
+                ruleId = cell >> 2
+                length = ruleLengths[ruleId]
+                if length:
+                    del states[-length:]
+                state = table[states[-1] * width + ruleLeft[ruleId]] >> 2
+                states.append(state)
+
+        if control:
+            control.checkTree()
+    except ValueError as e:
+        if e.args[1:2] == (2,):
+            # nondeterministic step failed
+            exitCode = 2
+        err = ValueError(e.args[0], exitCode)
+
+    if err:
+        raise err
+    return True
+
+
+def analyze(input, name='<input>'):
+    """
+    Analyze input, return True if it belongs to grammar.
+
+    input is string, file object or iterable of string chunks, files are
+    read as tokens are needed, raises ValueError(message, exit code, line,
+    pos)
+    """
+    scanner = InputParser(input, Terminals, END)
+    try:
+        return analyzeTokens(scanner.getToken)
+    except ValueError as e:
+        line, pos = scanner.getLine(), scanner.getPos()
+        raise ValueError(e.args[0] + "\\n(file: '" + name + "', line: " +
+                         str(line) + ", pos: " + str(pos) + ")",
+                         e.args[1], line, pos)
+
+
+def errPrint(exitCode, message):
+    """Print error message to stderr and exit with exit code."""
+    sys.stderr.write(err_messages[exitCode] + ": " + message + "\\n")
+    sys.exit(exitCode)
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """Argument parser exiting with code of arguments error."""
+
+    def error(self, message):
+        """Print err message."""
+        errPrint(10, message)
+
+
+def main():
+    """Analyze input file, exit code tells the result."""
+    argp = ArgumentParser(description='Parser of grammar ' + GRAMMAR)
+    argp.add_argument('input',
+                      nargs='?',
+                      default=sys.stdin,
+                      type=argparse.FileType('r'),
+                      metavar='INPUT',
+                      help='Input string file, <stdin> if not present')
+    args = argp.parse_args()
+    try:
+        with args.input:
+            analyze(args.input, args.input.name)
+    except ValueError as e:
+        errPrint(e.args[1], e.args[0])
+    except Exception:
+        errPrint(99, traceback.format_exc())
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def _constant(name, value):
+    """Get assignment of constant, long lists are wrapped."""
+    if isinstance(value, frozenset):
+        return _wrapped(name + ' = frozenset([',
+                        [repr(item) for item in sorted(value)], '])')
+    if isinstance(value, (list, dict)):
+        if isinstance(value, list):
+            items = [repr(item) for item in value]
+            opening, closing = '[', ']'
+        else:
+            items = [repr(key) + ': ' + repr(value[key]) for key in value]
+            opening, closing = '{', '}'
+        return _wrapped(name + ' = ' + opening, items, closing)
+    return name + ' = ' + repr(value) + '\n'
+
+
+def _wrapped(opening, items, closing):
+    """Get items separated by commas in lines of at most 79 chars."""
+    lines = [opening]
+    line = '   '
+    for item in items:
+        if len(line) + len(item) + 2 > 79 and line != '   ':
+            lines.append(line)
+            line = '   '
+        line += ' ' + item + ','
+    if line != '   ':
+        lines.append(line)
+    if len(lines) == 1:
+        return opening + closing + '\n'
+    return '\n'.join(lines) + '\n' + closing + '\n'
+
+
+def emitModule(compiled, name, module='parser.py'):
+    """
+    Get source of module analyzing inputs by compiled grammar.
+
+    module needs no grammar parsing nor table building, name of grammar
+    file and module file name are used in its docs
+    """
+    grammar = compiled.grammar
+    table = compiled.table
+    automat = compiled.automat
+    symbolIds = grammar.symbolIds
+
+    source = _HEADER.format(name=name, module=module)
+    source += _constant('GRAMMAR', name)
+    source += '\n# lr table\n'
+    source += _constant('WIDTH', table.width)
+    source += _constant('STATES', len(table.table) // table.width)
+    # only cells other than error, table is mostly empty
+    source += _constant('CELLS', {index: cell
+                                  for index, cell in enumerate(table.table)
+                                  if cell != 0})
+    source += 'TABLE = array(\'i\', [0]) * (WIDTH * STATES)\n'
+    source += 'for index, cell in CELLS.items():\n'
+    source += '    TABLE[index] = cell\n'
+    source += _constant('RULE_LEFT', table.ruleLeftIds)
+    source += _constant('RULE_LENGTHS', table.ruleLengths)
+    # shift state (False if there is none) and rules of reduces
+    conflicts = []
+    for item in table.conflicts:
+        shift = item.shift.state if item.shift else False
+        conflicts.append((shift, [reduce.state for reduce in item.reduce]))
+    source += _constant('CONFLICTS', conflicts)
+    source += '\n# symbol names by id and rules for messages\n'
+    source += _constant('SYMBOLS', grammar.symbolNames)
+    source += _constant('RULES', [str(rule) for rule in grammar.rules])
+    source += '\n# scanner\n'
+    source += 'PATTERN = re.compile(' + \
+        repr(compiled.scanner.pattern.pattern) + ')\n'
+    source += _constant('TERMINALS', {terminal: symbolIds[terminal]
+                                      for terminal in grammar.terminals})
+    source += _constant('END', symbolIds[''])
+
+    source += '\n# control automat, maps of symbols from state to state\n'
+    source += _constant('CONTROL', automat is not False)
+    if automat:
+        maps = automatMaps(automat)
+        source += _constant('START', automat.getStart())
+        source += _constant('TERMINATING', frozenset(
+            state for state in automat.getStates() if automat.isTerm(state)))
+        source += _constant('SYMBOL_STATES', {
+            symbolIds[symbol]: maps.maps[states]
+            for symbol, states in maps.symbolMaps.items()
+            if symbol in symbolIds})
+        # levels are merged and checked the same as by tcgp.py
+        source += '\n\n' + inspect.getsource(LevelStates) + '\n\n' + \
+            inspect.getsource(AutomatMaps) + _CONTROL
+    # scanner is the same as of tcgp.py, tokens are symbol ids
+    source += _RUNTIME + '\n\nclass Terminals:\n' + \
+        '    """Pattern and terminals of scanner."""\n\n' + \
+        '    pattern = PATTERN\n    terminals = TERMINALS\n\n\n' + \
+        inspect.getsource(InputParser) + _ANALYSIS
+    return source
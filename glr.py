@@ -0,0 +1,378 @@
+"""Generalized LR analysis, all alternatives of conflicts are followed."""
+
+from tree import Tree
+from lr_table import ERROR
+from lr_table import SHIFT
+from lr_table import REDUCE
+from lr_table import SPECIAL
+from lr_table import ACCEPT
+from parse_trace import debugTrace
+from debug_print import Debug
+from profiler import Profiler
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class StackNode:
+    """
+    Node of graph structured stack.
+
+    node is state of lr table at position in input (number of shifted
+    tokens), its edges lead to nodes below it
+    """
+
+    def __init__(self, state, position):
+        """Initialization."""
+        self.state = state
+        self.position = position
+        self.edges = []
+        # nodes below and levels states of edges, edges are not repeated
+        self.keys = set()
+        # nodes of the same position with edge to this node (empty symbol)
+        self.emptyAbove = []
+
+
+class StackEdge:
+    """
+    Edge of graph structured stack, symbol with its subtree.
+
+    levels are states of symbol subtree (False without automat), key is
+    their number, only first derivation of symbol with the same levels
+    states is kept, others are the same for the rest of analysis,
+    derivation is rule and edges of its right side (rule is False for
+    token)
+    """
+
+    def __init__(self, node, below, levels, key, symbol, rule, children):
+        """Initialization."""
+        self.node = node
+        self.below = below
+        self.levels = levels
+        self.key = key
+        self.symbol = symbol
+        self.rule = rule
+        self.children = children
+
+
+class GLR:
+    """
+    Analysis following all alternatives of conflicts in lr table at once.
+
+    stacks of alternatives are kept in graph structured stack, alternatives
+    with the same state on top are merged and their symbols are shared as
+    long as their subtrees have the same levels states, so their result is
+    certain (exit code 2 only when derivations with cycles were too deep
+    or analysis needed more than workBudget steps per input token)
+    """
+
+    # steps of reduction paths per input token, levels states of trees
+    # with cycles can make too many paths to follow
+    workBudget = 100000
+
+    def __init__(self, table):
+        """Initialization, table - LRTable."""
+        self.lrTable = table
+        self.grammar = table.grammar
+        self.automat = table.automat
+        self.table = table.table
+        self.width = table.width
+        # actions of table cells
+        self._actions = {}
+        # numbers of levels states, by states of top level and number
+        # of levels below
+        self._levelNumbers = {}
+        # derivation without cycles has at most this many levels over
+        # each position of input
+        self._levelsLimit = len(self.grammar.nonterminals) + 1
+
+    def analyzeSymbols(self, getToken, buildTree=True, trace=False):
+        """
+        Analyze symbols by lr table, all alternatives are followed.
+
+        returns derivation tree (first one found if there are more),
+        without buildTree True is returned, trace - ParseTrace getting
+        events of derivation (only when it is found)
+        """
+        trace = debugTrace(trace)
+        buildTree = buildTree or Debug.isActivated('tree')
+        terminalIds = self.lrTable.terminalIds
+        # tree of automat maps, used for levels states of all alternatives
+        self._tree = Tree(self.automat, self.grammar, False)
+        self._root = StackNode(0, 0)
+        self._cut = False
+        self._shifts = self._reduces = self._conflicts = 0
+        self._work = 0
+        nodes = {0: self._root}
+        position = 0
+        token = getToken()
+        accepted = False
+        err = False
+        # error of reading input, not of analysis step
+        inputError = False
+        try:
+            while accepted is False:
+                tokenId = terminalIds.get(token)
+                if tokenId is None:
+                    raise ValueError("Symbol '" + token +
+                                     "' is not in grammar alphabet.", 1)
+                self._reduceAll(nodes, tokenId, position)
+                if Profiler.active:
+                    self._countConflicts(nodes, tokenId)
+                accepted = self._accepted(nodes, tokenId)
+                if accepted is False:
+                    nodes = self._shiftAll(nodes, token, tokenId, position)
+                    if not nodes:
+                        raise self._error("No alternative of analysis " +
+                                          "continues with token '" + token +
+                                          "'")
+                    position += 1
+                    try:
+                        token = getToken()
+                    except ValueError:
+                        inputError = True
+                        raise
+        except ValueError as e:
+            err = ValueError(e.args[0], e.args[1] if e.args[1:] else 1)
+            if trace:
+                trace.step('error', False, message=err.args[0],
+                           code=err.args[1], **({'input': True}
+                                                if inputError else {}))
+
+        if Profiler.active:
+            Profiler.count('shifts', self._shifts)
+            Profiler.count('reduces', self._reduces)
+            Profiler.count('conflicts', self._conflicts)
+
+        if err:
+            raise err
+
+        if not buildTree and not trace:
+            return True
+        tree = self._derive(accepted, buildTree, trace)
+        if trace:
+            trace.step('accept', False)
+        return tree if buildTree else True
+
+    def _error(self, message):
+        """Get error of rejected input, certain unless some tree was cut."""
+        if self._cut:
+            return ValueError(message + " (derivations with cycles were " +
+                              "too deep to follow)", 2)
+        return ValueError(message, 1)
+
+    def _cellActions(self, state, tokenId):
+        """Get shift state (False if there is none) and rules to reduce."""
+        cell = self.table[state * self.width + tokenId]
+        actions = self._actions.get(cell)
+        if actions is None:
+            operation = cell & 3
+            if cell == ERROR or cell == ACCEPT:
+                actions = (False, ())
+            elif operation == SHIFT:
+                actions = (cell >> 2, ())
+            elif operation == REDUCE:
+                actions = (False, (cell >> 2,))
+            else:
+                # conflict, all its items are used
+                item = self.lrTable.conflicts[(cell >> 2) - 1]
+                actions = (item.shift.state if item.shift else False,
+                           tuple(it.state for it in item.getReduce()))
+            self._actions[cell] = actions
+        return actions
+
+    def _countConflicts(self, nodes, tokenId):
+        """Count nodes forked on conflict cell of token."""
+        for node in nodes.values():
+            cell = self.table[node.state * self.width + tokenId]
+            if cell != ACCEPT and cell & 3 == SPECIAL:
+                self._conflicts += 1
+
+    def _reduceAll(self, nodes, tokenId, position):
+        """
+        Do all reductions before token, nodes are extended.
+
+        each reduction (rule, node below the path and levels states of
+        edges of the path) is done once, when edge is added to node,
+        reductions going through it are done, paths of nodes above it by
+        empty symbols are searched again
+        """
+        pending = [(node, False) for node in nodes.values()]
+        done = set()
+        budget = self.workBudget * (position + 1)
+        while pending:
+            node, first = pending.pop()
+            for ruleId in self._cellActions(node.state, tokenId)[1]:
+                length = self.lrTable.ruleLengths[ruleId]
+                if length == 0:
+                    if first is not False:
+                        continue
+                    paths = [((node, ()), ())]
+                else:
+                    paths = self._paths(node, length, first)
+                for (below, keys), path in paths:
+                    if self._work > budget:
+                        raise ValueError("Analysis needs more than " +
+                                         str(budget) + " steps, levels " +
+                                         "states of derivations with " +
+                                         "cycles are too many to follow", 2)
+                    key = (ruleId, below, keys)
+                    if key not in done:
+                        done.add(key)
+                        self._reduce(nodes, node, ruleId, path, position,
+                                     pending)
+
+    def _paths(self, node, length, first):
+        """
+        Generate paths of edges down from node, beginning by first if set.
+
+        paths are given with node below them and levels numbers of their
+        edges, paths with the same ones give the same reduction, so only
+        the first of them is followed
+        """
+        paths = {}
+        for edge in ([first] if first else node.edges):
+            paths.setdefault((edge.below, (edge.key,)), (edge,))
+        for i in range(length - 1):
+            nextPaths = {}
+            for (below, keys), path in paths.items():
+                self._work += len(below.edges)
+                for edge in below.edges:
+                    nextPaths.setdefault((edge.below, keys + (edge.key,)),
+                                         path + (edge,))
+            paths = nextPaths
+        for item in paths.items():
+            self._work += 1
+            yield item
+
+    def _reduce(self, nodes, node, ruleId, path, position, pending):
+        """Reduce path of edges by rule, new edges are added to pending."""
+        self._reduces += 1
+        rule = self.grammar.rules[ruleId]
+        below = path[-1].below if path else node
+        children = path[::-1]
+        levels = key = False
+        if self.automat:
+            levels = self._tree.mergeLevels([edge.levels
+                                             for edge in children],
+                                            rule.leftSide,
+                                            below is self._root)
+            if levels is False:
+                return
+            if levels.depth > (position - below.position + 1) * \
+                    self._levelsLimit:
+                # derivation has cycle, it wouldn't end
+                self._cut = True
+                return
+            key = self._levelsNumber(levels)
+
+        state = self.table[below.state * self.width +
+                           self.lrTable.ruleLeftIds[ruleId]] >> 2
+        top = nodes.get(state)
+        if top is None:
+            top = nodes[state] = StackNode(state, position)
+            pending.append((top, False))
+        edge = self._addEdge(top, below, levels, key, rule.leftSide, rule,
+                             children)
+        if edge is False:
+            return
+        pending.append((top, edge))
+        if below.position == position:
+            below.emptyAbove.append(top)
+        # nodes above by empty symbols have new paths through the edge
+        above = list(top.emptyAbove)
+        seen = set(above)
+        while above:
+            upper = above.pop()
+            pending.append((upper, False))
+            for nextUpper in upper.emptyAbove:
+                if nextUpper not in seen:
+                    seen.add(nextUpper)
+                    above.append(nextUpper)
+
+    def _levelsNumber(self, levels):
+        """
+        Get number of levels states, the same levels have the same number.
+
+        number is kept by levels, levels below new ones are shared with
+        children trees, so only new levels are numbered
+        """
+        new = []
+        while levels and levels.number is None:
+            new.append(levels)
+            levels = levels.below
+        number = levels.number if levels else -1
+        for levels in reversed(new):
+            key = (levels.states, number)
+            number = self._levelNumbers.setdefault(key,
+                                                   len(self._levelNumbers))
+            levels.number = number
+        return number
+
+    def _shiftAll(self, nodes, token, tokenId, position):
+        """Shift token on all nodes, get nodes of the next position."""
+        shifted = {}
+        for node in nodes.values():
+            state = self._cellActions(node.state, tokenId)[0]
+            if state is False:
+                continue
+            levels = key = False
+            if self.automat:
+                levels = self._tree.symbolLevels(token, node is self._root)
+                if levels is False:
+                    continue
+                key = self._levelsNumber(levels)
+            top = shifted.get(state)
+            if top is None:
+                top = shifted[state] = StackNode(state, position + 1)
+            self._shifts += 1
+            self._addEdge(top, node, levels, key, token, False, ())
+        return shifted
+
+    def _addEdge(self, node, below, levels, key, symbol, rule, children):
+        """Add edge to node, False if the same edge is there."""
+        if (below, key) in node.keys:
+            return False
+        node.keys.add((below, key))
+        edge = StackEdge(node, below, levels, key, symbol, rule, children)
+        node.edges.append(edge)
+        return edge
+
+    def _accepted(self, nodes, tokenId):
+        """Get edge of accepted start symbol, False if there is none."""
+        found = False
+        for node in nodes.values():
+            if self.table[node.state * self.width + tokenId] != ACCEPT:
+                continue
+            found = True
+            for edge in node.edges:
+                if not self.automat or \
+                        self._tree.failedLevel(edge.levels) is False:
+                    return edge
+        if found:
+            raise self._error("No derivation tree has all levels in " +
+                              "final state.")
+        return False
+
+    def _derive(self, edge, buildTree, trace):
+        """Apply derivation of edge to new tree, steps are passed to trace."""
+        tree = Tree(self.automat, self.grammar, buildTree)
+        # children are done before rule of their parent
+        stack = [(edge, False)]
+        while stack:
+            edge, reduce = stack.pop()
+            if edge.rule is False:
+                tree.pushSymbol(edge.symbol)
+                if trace:
+                    trace.step('shift', edge.node.state, token=edge.symbol)
+            elif reduce:
+                tree.applyRule(edge.rule)
+                if trace:
+                    trace.reduce(edge.rule, edge.node.state, tree)
+            else:
+                stack.append((edge, True))
+                stack.extend([(child, False)
+                              for child in reversed(edge.children)])
+        return tree
@@ -17,18 +17,29 @@ class Grammar:
         self.terminals = []
         self.nonterminals = []
         self.start = False
+        # symbols interned to small integers, end symbol ('') has id 0
+        self.symbolIds = {'': 0}
+        self.symbolNames = ['']
+        self._termFlags = [True]
+
+    def _intern(self, name, isTerm):
+        """Assign integer id to new symbol."""
+        self.symbolIds[name] = len(self.symbolNames)
+        self.symbolNames.append(name)
+        self._termFlags.append(isTerm)
 
     def addNonTerminal(self, name):
         """Add non-terminal."""
         if name == '':
             raise ValueError("Invalid terminal symbol '" + name +
                              "'", 3)
-        if name in self.terminals:
+        if name in self.symbolIds and self.isTerm(name):
             raise ValueError("Symbol '" + name +
                              "' is already in terminals", 3)
-        if name in self.nonterminals:
+        if name in self.symbolIds:
             raise ValueError("Duplicate symbol '" + name +
                              "' in nonterminals", 3)
+        self._intern(name, False)
         self.nonterminals.append(name)
 
     def addTerminal(self, name):
@@ -36,12 +47,13 @@ class Grammar:
         if name == '':
             raise ValueError("Invalid non-terminal symbol'" + name +
                              "'", 3)
-        if name in self.nonterminals:
+        if name in self.symbolIds and not self.isTerm(name):
             raise ValueError("Symbol '" + name +
                              "' is already in non-terminals", 3)
-        if name in self.terminals:
+        if name in self.symbolIds:
             raise ValueError("Duplicate symbol '" + name +
                              "' in terminals", 3)
+        self._intern(name, True)
         self.terminals.append(name)
 
     def addRule(self, leftSide, rightSide):
@@ -56,6 +68,14 @@ class Grammar:
         r = Rule(leftSide, rightSide)
         self.rules.append(r)
 
+    def augment(self, name):
+        """Add new first nonterminal with rule deriving start symbol."""
+        self._intern(name, False)
+        self.nonterminals = [name] + self.nonterminals
+        rule = Rule(name, [self.start])
+        self.rules = [rule] + self.rules
+        return rule
+
     def setStartSymbol(self, name):
         """Set start symbol."""
         if not self.isTerm(name):
@@ -66,13 +86,20 @@ class Grammar:
 
     def isTerm(self, name):
         """Decide if symbol is terminal or not."""
-        if name in self.terminals:
-            return True
-        elif name in self.nonterminals:
-            return False
-        else:
+        symbolId = self.symbolIds.get(name, 0)
+        if symbolId == 0:
             raise ValueError("Symbol '" + name +
                              "' is not in grammar alphabet", 3)
+        return self._termFlags[symbolId]
+
+    def symbolsOf(self, mask):
+        """Get symbols in bit mask over symbol ids."""
+        symbols = []
+        while mask:
+            lowest = mask & -mask
+            symbols.append(self.symbolNames[lowest.bit_length() - 1])
+            mask ^= lowest
+        return symbols
 
     def __str__(self):
         """To string."""
@@ -0,0 +1,76 @@
+"""On-disk cache of compiled grammars."""
+
+import os
+import stat
+import pickle
+import struct
+import hashlib
+import tempfile
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+# artifact starts with magic, format version and key of grammar
+MAGIC = b'TCGP'
+FORMAT_VERSION = 5
+HEADER = struct.Struct('<4sI32s')
+
+
+class GrammarCache:
+    """Directory of compiled grammars keyed by hash of grammar file."""
+
+    def __init__(self, directory):
+        """Initialization."""
+        self.directory = directory
+
+    def key(self, source, mode):
+        """Get key of grammar file content compiled in mode."""
+        return hashlib.sha256((mode + '\0' + source).encode()).digest()
+
+    def path(self, key):
+        """Get artifact path of key."""
+        return os.path.join(self.directory, key.hex() + '.tcgpc')
+
+    def load(self, source, mode):
+        """
+        Load compiled grammar, False if artifact is missing or unusable.
+
+        damaged artifact can make unpickling fail by any exception, grammar
+        is built again then, unpickling runs code of the artifact, so only
+        artifacts of current user not writable by others are loaded
+        """
+        key = self.key(source, mode)
+        try:
+            with open(self.path(key), 'rb') as f:
+                if not self._trusted(os.fstat(f.fileno())):
+                    return False
+                header = f.read(HEADER.size)
+                if len(header) != HEADER.size or \
+                        HEADER.unpack(header) != (MAGIC, FORMAT_VERSION, key):
+                    return False
+                return pickle.load(f)
+        except Exception:
+            return False
+
+    def _trusted(self, st):
+        """Check artifact is of current user and not writable by others."""
+        if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+            return False
+        return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    def store(self, source, mode, compiled):
+        """Store compiled grammar, replace stale artifact, raises OSError."""
+        key = self.key(source, mode)
+        os.makedirs(self.directory, exist_ok=True)
+        # write to temporary file first, so readers never see half of it
+        fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, key))
+                pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, self.path(key))
+        except BaseException:
+            os.unlink(tmpPath)
+            raise
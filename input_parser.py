@@ -1,5 +1,6 @@
 """Parse grammar and finite state automat from file."""
 
+import re
 from automat import Automat
 
 # -- coding: utf-8 --
@@ -8,19 +9,17 @@ __license__ = 'MIT'
 __version__ = '1.0'
 
 
-class InputParser:
-    """Parser of input file."""
+class Scanner:
+    """
+    Finite automat accepting grammar terminals.
 
-    def __init__(self, input, terminals):
-        """Start parsing."""
-        self.str = input
-        self.index = 0
-        self._line = 1
-        self._pos = 0
-        self._charLine = 1
-        self._charPos = 0
-        self._finals = {}
+    automat is kept for printouts, input is scanned by compiled pattern
+    matching the longest prefix of any terminal, the same way as automat
+    goes char by char until it gets stuck
+    """
 
+    def __init__(self, terminals):
+        """Build automat and pattern from terminals."""
         self.aut = Automat()
         start = '*S'
         self.aut.addState(start)
@@ -35,89 +34,153 @@ class InputParser:
                 self.aut.addRule(lastState, char, newState)
                 lastState = newState
             self.aut.setTerminating(lastState)
-            self._finals[lastState] = symb
 
         self.aut.dropERules()
         self.aut.determinate()
+        self.aut.minimize()
+
+        # terminal strings by themselves, scanned token is replaced by
+        # grammar's own string
+        self.terminals = {symb: symb for symb in terminals}
+        trie = {}
+        for symb in terminals:
+            node = trie
+            for char in symb:
+                node = node.setdefault(char, {})
+        # skip white chars, then the longest prefix of terminal
+        self.pattern = re.compile(r'\s*(' + self._triePattern(trie) + ')')
+
+    def _triePattern(self, node):
+        """Get pattern of trie node, every char is optional."""
+        alternatives = [re.escape(char) + self._triePattern(node[char])
+                        for char in sorted(node)]
+        if not alternatives:
+            return ''
+        return '(?:' + '|'.join(alternatives) + ')?'
+
+
+class InputParser:
+    """
+    Parser of input file.
+
+    input is string, file object or iterable of string chunks, files are
+    read by lines (of at most chunkSize characters) as tokens are requested,
+    so analysis of pipe goes on while it is written, end token is returned
+    after the whole input (its source is copied to emitted parser modules,
+    so it uses nothing else from this module)
+    """
+
+    chunkSize = 65536
+
+    def __init__(self, input, scanner, end=''):
+        """Start parsing, scanner - object with terminals and pattern."""
+        self._end = end
+        if isinstance(input, str):
+            self._chunks = iter((input,))
+        elif hasattr(input, 'readline'):
+            self._chunks = iter(lambda: input.readline(self.chunkSize),
+                                '')
+        else:
+            self._chunks = iter(input)
+        self._eof = False
+        # buffer of unprocessed input and position in it
+        self.str = ''
+        self.index = 0
+        # line and char position before the start of buffer
+        self._bufLine = 1
+        self._bufPos = 0
+        # offset of char in buffer, whose position is reported
+        # (-1 for position before buffer)
+        self._mark = -1
+        self._terminals = scanner.terminals
+        self._pattern = scanner.pattern
 
     def getLine(self):
         """Get last token line."""
-        return self._line
+        return self._position()[0]
 
     def getPos(self):
         """Get last token position."""
-        if self._pos == 0:
+        pos = self._position()[1]
+        if pos == 0:
             return 1
-        return self._pos
+        return pos
 
     def getToken(self):
         """Load next token."""
-        ch = self._getChar()
-        self._line = self._charLine
-        self._pos = self._charPos
-        state = 'begin'
-        s = ''
-        startState = self.aut.getStart()
-        while ch is not False:
-            # skip white chars
-            if state == 'begin':
-                self._line = self._charLine
-                self._pos = self._charPos
-                if ch.isspace():
-                    state = 'begin'
-                else:
-                    state = self.aut.applyCharToState(ch, startState)
-                    if state is False:
-                        raise ValueError("Input string error on character '" +
-                                         ch + "'.", 1)
-                    s += ch
-            else:
-                tmp = self.aut.applyCharToState(ch, state)
-                if tmp is False:
-                    self._ungetChar()
-                    finals = state.split("|")
-                    strs = []
-                    for final in finals:
-                        if final in self._finals:
-                            strs.append(self._finals[final])
-                    if len(strs) == 1:
-                        return strs[0]
-                    elif len(strs) == 0:
-                        raise ValueError("Symbol '" + s + "' is not "
-                                         "in terminals.", 1)
-                s += ch
-                state = tmp
-
-            ch = self._getChar()
-
-        # return empty token after reading whole file
-        return ''
-
-    def _ungetChar(self):
-        """Unget one character."""
-        if self.index > 0:
-            self.index -= 1
-            if self.str[self.index] == '\n':
-                # line counter
-                self._charLine -= 1
-                self._charPos = self._lastCharPos
-            else:
-                self._charPos -= 1
-        else:
-            raise ValueError("Nothing to unget", 40)
-
-    def _getChar(self):
-        """Load one character from input."""
-        if self.index < len(self.str):
-            ch = self.str[self.index]
-            if ch == '\n':
-                # line counter
-                self._charLine += 1
-                self._lastCharPos = self._charPos
-                self._charPos = 0
-            else:
-                self._charPos += 1
-            self.index += 1
-            return ch
-        else:
-            return False
+        buf = self.str
+        i = self.index
+        self._mark = i - 1
+        while True:
+            j, end = self._pattern.match(buf, i).span(1)
+            if j == len(buf):
+                # only white chars are left
+                if j > i:
+                    self._mark = j - 1
+                if not self._read(j):
+                    # return end token after reading whole file
+                    return self._end
+                buf = self.str
+                i = 0
+                continue
+
+            self._mark = j
+            if end == j:
+                raise ValueError("Input string error on character '" +
+                                 buf[j] + "'.", 1)
+            if end == len(buf):
+                # token can continue in next chunk
+                if self._read(j):
+                    buf = self.str
+                    i = 0
+                    continue
+                # token at the very end of input is not finished
+                # by any char, return end token
+                return self._end
+
+            s = buf[j:end]
+            token = self._terminals.get(s)
+            if token is None:
+                raise ValueError("Symbol '" + s + "' is not "
+                                 "in terminals.", 1)
+            self.index = end
+            return token
+
+    def _read(self, keep):
+        """
+        Drop buffer before keep offset and append next chunk of input.
+
+        returns False at the end of input
+        """
+        if not self._eof:
+            chunk = False
+            while not chunk:
+                try:
+                    chunk = next(self._chunks, False)
+                except UnicodeDecodeError as e:
+                    # not a ValueError of analysis, input can't be read
+                    raise OSError("Can't read input: " + str(e))
+                if chunk is False:
+                    self._eof = True
+                    break
+            if chunk:
+                buf = self.str
+                self._bufLine, self._bufPos = self._offsetPosition(keep - 1)
+                self._mark -= keep
+                self.str = buf[keep:] + chunk
+                self.index = 0
+                return True
+        return False
+
+    def _position(self):
+        """Get line and char position of marked char."""
+        return self._offsetPosition(self._mark)
+
+    def _offsetPosition(self, offset):
+        """Get line and char position after reading char on offset."""
+        buf = self.str
+        lines = buf.count('\n', 0, offset + 1)
+        if lines == 0:
+            return self._bufLine, self._bufPos + offset + 1
+        return (self._bufLine + lines,
+                offset - buf.rfind('\n', 0, offset + 1))
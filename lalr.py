@@ -0,0 +1,80 @@
+"""LALR(1) lookaheads."""
+
+from digraph import digraph
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class LALR:
+    """
+    LALR(1) lookaheads of reduce items in LR(0) groups.
+
+    sets are bit masks over symbol ids of grammar
+    """
+
+    def __init__(self, grammar, groups, eff):
+        """Compute lookaheads by DeRemer and Pennello algorithm."""
+        self.grammar = grammar
+        isTerm = grammar.isTerm
+        symbolIds = grammar.symbolIds
+        groups = groups.groups
+
+        # nonterminal transitions (state, nonterminal)
+        transitions = []
+        # directly read symbols
+        directRead = {}
+        for p, group in enumerate(groups):
+            for symbol in group.transitions:
+                if not isTerm(symbol):
+                    transitions.append((p, symbol))
+
+        reads = {}
+        for p, A in transitions:
+            r = groups[p].transitions[A]
+            direct = 0
+            readRel = []
+            for symbol in groups[r].transitions:
+                if isTerm(symbol):
+                    direct |= 1 << symbolIds[symbol]
+                elif eff.empty([symbol]):
+                    readRel.append((r, symbol))
+            if p == 0 and A == grammar.start:
+                # end of input follows start symbol
+                direct |= 1
+            directRead[(p, A)] = direct
+            reads[(p, A)] = readRel
+
+        read = digraph(transitions, reads, directRead)
+
+        sideRules = {}
+        for rule in grammar.rules:
+            if rule.leftSide not in sideRules:
+                sideRules[rule.leftSide] = []
+            sideRules[rule.leftSide].append(rule)
+
+        # includes and lookback relations
+        includes = {x: [] for x in transitions}
+        self._lookback = {}
+        for p, B in transitions:
+            for rule in sideRules[B]:
+                q = p
+                for i, symbol in enumerate(rule.rightSide):
+                    if not isTerm(symbol) and eff.emptySuffix(rule, i + 1):
+                        includes[(q, symbol)].append((p, B))
+                    q = groups[q].transitions[symbol]
+                key = (q, rule.id)
+                if key not in self._lookback:
+                    self._lookback[key] = []
+                self._lookback[key].append((p, B))
+
+        self._follow = digraph(transitions, includes, read)
+
+    def lookahead(self, state, rule):
+        """Get lookahead symbols of reduce by rule in state."""
+        symbols = 0
+        for transition in self._lookback.get((state, rule.id), ()):
+            symbols |= self._follow[transition]
+        return self.grammar.symbolsOf(symbols)
@@ -1,17 +1,27 @@
 """LR Table."""
 
-from rule import Rule
+from array import array
 from operation import Operation
 from tree import Tree
 from eff import EFF
+from lalr import LALR
 from debug_print import debug_print
 from debug_print import Debug
+from profiler import Profiler
+from parse_trace import debugTrace
 
 # -- coding: utf-8 --
 __author__ = 'stepan'
 __license__ = 'MIT'
 __version__ = '1.0'
 
+# compiled table cell - operation in two lowest bits, argument in the rest
+ERROR = 0
+SHIFT = 1       # shift or goto, argument is state
+REDUCE = 2      # argument is rule id
+SPECIAL = 3     # argument 0 is end point, n > 0 is n-th conflicting item
+ACCEPT = SPECIAL
+
 
 class LRRule:
     """Rule with position mark."""
@@ -83,19 +93,17 @@ class Item:
 
 
 class TableItem:
-    """Table item array of conflicting Items."""
-
-    shiftReduceAllow = False
-    reduceReduceAllow = False
+    """
+    Table item array of conflicting Items.
 
-    @classmethod
-    def setConflicts(cls, sr, rr):
-        """Set up allowed conflicts."""
-        cls.shiftReduceAllow = sr
-        cls.reduceReduceAllow = rr
+    allowed conflicts are given by table creating the item, so tables
+    built at once (threads of parse server) don't share them
+    """
 
-    def __init__(self, item):
+    def __init__(self, item, shiftReduceAllow=False, reduceReduceAllow=False):
         """Initialization."""
+        self.shiftReduceAllow = shiftReduceAllow
+        self.reduceReduceAllow = reduceReduceAllow
         self.reduce = []
         self.shift = False
         self.addItem(item)
@@ -128,17 +136,16 @@ class TableItem:
 
     def checkConflicts(self):
         """Check shift-reduce and reduce-reduce conflict."""
-        cls = type(self)
         self.isReduceReduce = False
         self.isShiftReduce = False
         if (self.shift is not False) and (len(self.reduce) >= 1):
             self.isShiftReduce = True
-            if not cls.shiftReduceAllow:
+            if not self.shiftReduceAllow:
                 return False
 
         if len(self.reduce) >= 2:
             self.isReduceReduce = True
-            if not cls.reduceReduceAllow:
+            if not self.reduceReduceAllow:
                 return False
         return True
 
@@ -166,31 +173,21 @@ class TableItem:
         return s
 
 
-class StackItem:
-    """Stack item - symbol and state."""
-
-    def __init__(self, symbol, state):
-        """Initialization."""
-        self.state = state
-        self.symbol = symbol
-
-    def __str__(self):
-        """To string."""
-        s = "<" + self.symbol + ","
-        s += str(self.state) + ">"
-        return s
-
-
 class LRGroup:
-    """State group of rules with marker."""
-    def __init__(self, rules):
-        """Init with init rules and make hash out of it."""
-        self.rules = rules
-
-        # create unique id from ids of original rules and markers
-        # this is importnant for faster comparing of groups
-        self.id = "".join([str(id(rule.r)) + str(rule.marker)
-                          for rule in rules])
+    """
+    State group of rules with marker.
+
+    rules with marker are stored as (rule id, marker) pairs
+    """
+    def __init__(self, items, rules):
+        """Init with kernel items and make hash out of it."""
+        self.items = items
+        self._rules = rules
+
+        # create kernel key from ids of original rules and markers
+        # this is important for faster comparing and hashing of groups,
+        # kernels with the same items in any order are one state
+        self.id = frozenset(items)
         self.transitions = {}
 
     def addTransition(self, symbol, stateId):
@@ -198,20 +195,26 @@ class LRGroup:
         self.transitions[symbol] = stateId
 
     def getMarkedSymbols(self):
-        """Get array of symbols after marker in group."""
+        """Get items with symbol after marker, grouped by the symbol."""
         markedSymbols = {}
-        for rule in self.rules:
-            symbol = rule.getMarkedSymbol()
-            if symbol is not False:
+        rules = self._rules
+        for item in self.items:
+            rightSide = rules[item[0]].rightSide
+            if item[1] < len(rightSide):
+                symbol = rightSide[item[1]]
                 if symbol not in markedSymbols:
                     markedSymbols[symbol] = []
-                if rule not in markedSymbols[symbol]:
-                    markedSymbols[symbol].append(rule)
+                markedSymbols[symbol].append(item)
         return markedSymbols
 
+    def getRules(self):
+        """Get items as LRRule objects."""
+        return [LRRule(self._rules[ruleId], marker)
+                for ruleId, marker in self.items]
+
     def __str__(self):
         """To string."""
-        return ", ".join([str(rule) for rule in self.rules])
+        return ", ".join([str(rule) for rule in self.getRules()])
 
     def __eq__(self, other):
         """Compare groups by id generated from original rules nad markers."""
@@ -220,6 +223,10 @@ class LRGroup:
         else:
             return False
 
+    def __hash__(self):
+        """Hash function."""
+        return hash(self.id)
+
 
 class LRGroups:
     """LR State groups generator and helper."""
@@ -227,12 +234,30 @@ class LRGroups:
     def __init__(self, grammar, firstRule):
         """Create state groups from grammar."""
         self.grammar = grammar
-        firstGroup = LRGroup([firstRule])
+        rules = grammar.rules
+        nonterminals = set(grammar.nonterminals)
+
+        # rules (marked at the beginning) by their left side
+        # and nonterminals, which are at the beginning of these rules
+        self._sideItems = {nonterm: [] for nonterm in nonterminals}
+        self._leading = {nonterm: [] for nonterm in nonterminals}
+        for rule in rules:
+            self._sideItems[rule.leftSide].append((rule.id, 0))
+            if rule.rightSide and rule.rightSide[0] in nonterminals:
+                leading = self._leading[rule.leftSide]
+                if rule.rightSide[0] not in leading:
+                    leading.append(rule.rightSide[0])
+        # closures by marked nonterminals of kernel
+        self._closures = {}
+
+        firstGroup = LRGroup([(firstRule.r.id, firstRule.marker)], rules)
 
         self.groups = [firstGroup]
+        # kernel of group -> state number
+        self._groupIds = {firstGroup.id: 0}
 
         # create state groups
-        for i, group in enumerate(self.groups):
+        for group in self.groups:
             self._groupClosure(group)
             self.newGroupsFromGroup(group)
 
@@ -240,31 +265,39 @@ class LRGroups:
         """Get new groups with moved marker."""
         markedSymbols = group.getMarkedSymbols()
         for symbol in markedSymbols:
-            rules = markedSymbols[symbol]
-            groupRules = []
-            for rule in rules:
-                groupRules.append(rule.moveMarker())
-            newGroup = LRGroup(groupRules)
-            if newGroup not in self.groups:
+            newGroup = LRGroup([(ruleId, marker + 1)
+                                for ruleId, marker in markedSymbols[symbol]],
+                               self.grammar.rules)
+            stateId = self._groupIds.get(newGroup.id)
+            if stateId is None:
                 # group composed from this rules is not in groups
+                stateId = len(self.groups)
+                self._groupIds[newGroup.id] = stateId
                 self.groups.append(newGroup)
-            group.addTransition(symbol, self.groups.index(newGroup))
+            group.addTransition(symbol, stateId)
 
     def _groupClosure(self, group):
         """Get LR closure for rule."""
-        while True:
-            change = False
-            for rule1 in group.rules:
-                symbol = rule1.getMarkedSymbol()
-                if symbol is not False and not self.grammar.isTerm(symbol):
-                    for rule2 in self.grammar.rules:
-                        if rule2.leftSide == symbol:
-                            markedR = LRRule(rule2, 0)
-                            if markedR not in group.rules:
-                                change = True
-                                group.rules.append(markedR)
-            if not change:
-                break
+        rules = self.grammar.rules
+        marked = []
+        for ruleId, marker in group.items:
+            rightSide = rules[ruleId].rightSide
+            if marker < len(rightSide) and rightSide[marker] in self._leading:
+                marked.append(rightSide[marker])
+        marked = tuple(marked)
+
+        if marked not in self._closures:
+            # rules of nonterminals in order of their first usage
+            closure = []
+            expanded = set()
+            queue = list(marked)
+            for nonterm in queue:
+                if nonterm not in expanded:
+                    expanded.add(nonterm)
+                    closure.extend(self._sideItems[nonterm])
+                    queue.extend(self._leading[nonterm])
+            self._closures[marked] = closure
+        group.items = group.items + self._closures[marked]
 
     def __str__(self):
         """"To string."""
@@ -277,55 +310,87 @@ class LRGroups:
 class LRTable:
     """Create LR table from given grammar."""
 
-    def __init__(self, grammar, precedence, automat):
-        """Initialization."""
+    modes = ('slr', 'lalr')
+
+    # check symbols on stack by every reduce, class attribute so that
+    # it is not stored with cached tables
+    verify = False
+
+    def __init__(self, grammar, precedence, automat, mode='slr'):
+        """
+        Initialization.
+
+        mode decides how lookaheads of reduce operations are computed:
+         - slr:  follow set of rule left side
+         - lalr: LALR(1) lookaheads
+        """
+        if mode not in self.modes:
+            raise ValueError("Undefined LR table mode '" + str(mode) + "'",
+                             99)
+        self.mode = mode
         self.grammar = grammar
         self.automat = automat
         self.lrtable = []
         self.precendece = precedence
 
-        # setup table item for allowing conflicts
+        # allowed conflicts of table items
         # based on what instruments (automat, precedence) are available
-        TableItem.setConflicts(
-            self.automat is not False or self.precendece is not False,
-            self.automat is not False
-        )
-
-        additionalRule = Rule('S*', [self.grammar.start])
-        self.grammar.rules = [additionalRule] + self.grammar.rules
-        self.grammar.nonterminals = ['S*'] + self.grammar.nonterminals
+        self.shiftReduceAllow = \
+            self.automat is not False or self.precendece is not False
+        self.reduceReduceAllow = self.automat is not False
+
+        additionalRule = self.grammar.augment('S*')
         firstRule = LRRule(additionalRule, 0)
 
         # add priorities to rules by their order
         for i, rule in enumerate(reversed(self.grammar.rules)):
             rule.priority = i
 
-        self.groups = LRGroups(grammar, firstRule)
+        # number rules by their order, number is used as rule id
+        for i, rule in enumerate(self.grammar.rules):
+            rule.id = i
+
+        with Profiler.phase('groups'):
+            self.groups = LRGroups(grammar, firstRule)
         debug_print('groups', self.groups, '\n')
         groups = self.groups
 
-        self.eff = EFF(grammar)
+        with Profiler.phase('eff'):
+            self.eff = EFF(grammar)
         debug_print('eff', self.eff, '\n')
 
-        endRule = LRRule(additionalRule, 1)
+        if mode == 'lalr' or Debug.isActivated('conflicts'):
+            with Profiler.phase('lalr'):
+                self.lalr = LALR(grammar, groups, self.eff)
+        if Debug.isActivated('conflicts'):
+            debug_print('conflicts', self.conflictsReport(), '\n')
+
+        if mode == 'lalr':
+            lookahead = self.lalr.lookahead
+        else:
+            lookahead = self._followLookahead
+
+        endItem = (additionalRule.id, 1)
+        rules = self.grammar.rules
         lrtable = self.lrtable
         for i, group in enumerate(groups.groups):
             lrtable.append({})
-            for rule in group.rules:
-                if rule == endRule:
+            for groupItem in group.items:
+                if groupItem == endItem:
                     # end point marked as -1
                     self._addToTable(i, '', -1)
                     continue
-                markedS = rule.getMarkedSymbol()
-                if markedS is False:
+                rule = rules[groupItem[0]]
+                if groupItem[1] == len(rule.rightSide):
                     # marked symbol on last position - reduce operation
-                    follow = self.eff.follow(rule.r.leftSide)
+                    follow = lookahead(i, rule)
                     for symbol in follow:
-                        item = Item(self.grammar.rules.index(rule.r),
-                                    Operation.reduce)
+                        item = Item(rule.id, Operation.reduce)
                         self._addToTable(i, symbol, item)
+                    continue
 
-                elif not self.grammar.isTerm(markedS):
+                markedS = rule.rightSide[groupItem[1]]
+                if not self.grammar.isTerm(markedS):
                     # marked symbol is non-terminal - beta part of table
                     self._addToTable(i, markedS, group.transitions[markedS])
 
@@ -355,6 +420,84 @@ class LRTable:
                                              "] can't be handled be " +
                                              "precendece table", 4)
         debug_print('table', self)
+        self._compile()
+
+    def _compile(self):
+        """Compile table into flat array of integer cells."""
+        grammar = self.grammar
+        symbolIds = grammar.symbolIds
+        self.width = width = len(grammar.symbolNames)
+        self.table = table = array('i', [ERROR]) * (width * len(self.lrtable))
+        # table items with conflict, solved during analysis
+        self.conflicts = []
+        for i, row in enumerate(self.lrtable):
+            for symbol in row:
+                cell = row[symbol]
+                index = i * width + symbolIds[symbol]
+                if isinstance(cell, TableItem):
+                    if cell.isShiftReduce or cell.isReduceReduce:
+                        self.conflicts.append(cell)
+                        table[index] = (len(self.conflicts) << 2) | SPECIAL
+                    else:
+                        table[index] = self._encodeItem(cell.getItem())
+                elif cell == -1:
+                    table[index] = ACCEPT
+                else:
+                    table[index] = (cell << 2) | SHIFT
+
+        self.terminalIds = {symbol: symbolIds[symbol]
+                            for symbol in [''] + grammar.terminals}
+        self.ruleLeftIds = [symbolIds[rule.leftSide] for rule in grammar.rules]
+        self.ruleLengths = [len(rule.rightSide) for rule in grammar.rules]
+
+    def __getstate__(self):
+        """Get state for pickling, without objects needed only for build."""
+        state = self.__dict__.copy()
+        for helper in ('groups', 'eff', 'lalr'):
+            state.pop(helper, None)
+        return state
+
+    def _encodeItem(self, item):
+        """Encode shift or reduce item as table cell."""
+        if item.operation == Operation.shift:
+            return (item.state << 2) | SHIFT
+        else:
+            return (item.state << 2) | REDUCE
+
+    def _followLookahead(self, state, rule):
+        """Get SLR lookahead symbols of reduce by rule in state."""
+        return self.eff.follow(rule.leftSide)
+
+    def countConflicts(self, lookahead):
+        """Count shift-reduce and reduce-reduce cells with given lookahead."""
+        shiftReduce = 0
+        reduceReduce = 0
+        rules = self.grammar.rules
+        for i, group in enumerate(self.groups.groups):
+            reduces = {}
+            for ruleId, marker in group.items:
+                rule = rules[ruleId]
+                if marker != len(rule.rightSide) or ruleId == 0:
+                    # not a reduce item or end point
+                    continue
+                for symbol in lookahead(i, rule):
+                    reduces[symbol] = reduces.get(symbol, 0) + 1
+            for symbol in reduces:
+                if symbol in group.transitions:
+                    shiftReduce += 1
+                if reduces[symbol] >= 2:
+                    reduceReduce += 1
+        return shiftReduce, reduceReduce
+
+    def conflictsReport(self):
+        """Compare conflicts counts of SLR and LALR table."""
+        s = "mode\tshift-reduce\treduce-reduce"
+        for mode, lookahead in (('slr', self._followLookahead),
+                                ('lalr', self.lalr.lookahead)):
+            shiftReduce, reduceReduce = self.countConflicts(lookahead)
+            s += "\n" + mode + "\t" + str(shiftReduce) + "\t" + \
+                str(reduceReduce)
+        return s
 
     def _addToTable(self, group, symbol, item):
         row = self.lrtable[group]
@@ -382,161 +525,226 @@ class LRTable:
             # no conflict
             if type(item) == Item:
                 # create table item object
-                row[symbol] = TableItem(item)
+                row[symbol] = TableItem(item, self.shiftReduceAllow,
+                                        self.reduceReduceAllow)
             else:
                 # simple number
                 row[symbol] = item
 
-    def analyzeSymbols(self, getToken):
-        """Analyze symbols by ll_table."""
-        grammar = self.grammar
-        table = self.lrtable
+    def analyzeSymbols(self, getToken, buildTree=True, trace=False):
+        """
+        Analyze symbols by lr table.
+
+        returns derivation tree, without buildTree only acceptance is
+        checked and True is returned (tree is built anyway for debug print),
+        trace - ParseTrace getting events of analysis
+        """
+        rules = self.grammar.rules
+        table = self.table
+        width = self.width
+        terminalIds = self.terminalIds
+        ruleLeftIds = self.ruleLeftIds
+        ruleLengths = self.ruleLengths
         automat = self.automat
 
-        # put end symbol and state 0 on stack
-        stack = [StackItem('', 0)]
+        # debug print of analysis is rendered from trace events
+        trace = debugTrace(trace)
+
+        # stack of states with state 0 of end symbol, symbols are kept
+        # only for verification of reduces
+        states = [0]
+        symbols = [''] if self.verify else False
 
         state = 0
         token = getToken()
-        tree = Tree(automat, self.grammar)
+        buildTree = buildTree or Debug.isActivated('tree')
+        tree = Tree(automat, self.grammar, buildTree)
+        # without tree and automat there is nothing to do with tree
+        useTree = buildTree or automat is not False
         err = False
-        self.exit_code = 1
+        # exit code of error, 2 after nondeterministic step
+        exitCode = 1
+        # tried rules of conflict, only for trace
+        conflict = False
+        # counters of profiler
+        shifts = reduces = conflicts = 0
+        # error of reading input, not of analysis step
+        inputError = False
         try:
             while True:
-                if Debug.isActivated('stack'):
-                    debug_print('stack', state,
-                                "".join([str(item) for item in stack]))
-
-                if token not in self.grammar.terminals and token != '':
+                tokenId = terminalIds.get(token)
+                if tokenId is None:
                     # input symbol is not in grammar alphabet
                     # no matter what this string doesn't bellow to grammar
-                    self.exit_code = 1
+                    exitCode = 1
                     raise ValueError("Symbol '" + token +
                                      "' is not in grammar alphabet.")
-                if token not in table[state]:
+                # get cell from table
+                cell = table[state * width + tokenId]
+                if cell == ERROR:
                     # no rule for this symbol and state
                     raise ValueError("No rule for token '" + token +
                                      "' in state " + str(state))
-                # get item from table
-                alpha = table[state][token]
-                if alpha == -1:
+                if cell == ACCEPT:
                     # we are at the end
                     break
 
-                # get item (solve conflicts)
-                item = self._getItem(
-                    stack, alpha, state, token, tree)
-
-                if item.operation == Operation.shift:
-                    # shift - add symbol to stack
-                    stack.append(StackItem(token, item.state))
-                    token = getToken()
-                    state = item.state
+                operation = cell & 3
+                if operation == SPECIAL:
+                    conflicts += 1
+                    if trace:
+                        conflict = {'tried': [], 'guessed': False}
+                    # get item (solve conflicts)
+                    item, guessed = self._getItem(
+                        self.conflicts[(cell >> 2) - 1],
+                        state, token, tree, conflict)
+                    if guessed:
+                        exitCode = 2
+                    cell = self._encodeItem(item)
+                    operation = cell & 3
+                elif operation == SHIFT:
+                    if useTree:
+                        tree.pushSymbol(token)
+                else:
+                    rule = rules[cell >> 2]
+                    if useTree and not tree.applyRule(rule):
+                        raise ValueError("Rule " + str(rule) +
+                                         " can't be used, because " +
+                                         "of tree conflict.")
+
+                if operation == SHIFT:
+                    # shift - add state to stack
+                    shifts += 1
+                    state = cell >> 2
+                    states.append(state)
+                    if symbols:
+                        symbols.append(token)
+                    if trace:
+                        trace.step('shift', state, conflict, token=token)
+                        conflict = False
+                    try:
+                        token = getToken()
+                    except ValueError:
+                        inputError = True
+                        raise
                 else:
-                    # reduce - apply rule
-                    rule = grammar.rules[item.state]
-                    for s1 in reversed(rule.rightSide):
-                        # check, that symbols on stack are same with right side
-                        # of the rule
-                        pSymbol = stack.pop()
-                        if pSymbol.symbol != s1:
-                            raise ValueError("Expecting '" + str(s1) +
-                                             "', got '" + str(pSymbol) +
-                                             "' from rule " + str(rule))
-                    # get state of last symbol on stack
-                    symbolState = stack[-1].state
-                    # get new state from beta table
-                    state = table[symbolState][rule.leftSide]
-                    # add rule left side to stack
-                    stack.append(StackItem(rule.leftSide, state))
-                debug_print('trees', tree, '\n')
+                    # reduce - remove right side of the rule from stack
+                    reduces += 1
+                    ruleId = cell >> 2
+                    length = ruleLengths[ruleId]
+                    if symbols:
+                        self._verifyReduce(symbols, rules[ruleId])
+                    if length:
+                        del states[-length:]
+                    # get new state from goto part of table
+                    state = table[states[-1] * width +
+                                  ruleLeftIds[ruleId]] >> 2
+                    states.append(state)
+                    if trace:
+                        trace.reduce(rules[ruleId], state, tree, conflict)
+                        conflict = False
 
             tree.checkTree()
+            if trace:
+                trace.step('accept', False)
         except ValueError as e:
-            err = ValueError(e.args[0], self.exit_code)
+            if e.args[1:2] == (2,):
+                # nondeterministic step failed
+                exitCode = 2
+            elif e.args[1:2] == (99,):
+                # stack doesn't fit the table, not an error of input
+                exitCode = 99
+            err = ValueError(e.args[0], exitCode)
+            if trace:
+                trace.step('error', False, conflict, message=e.args[0],
+                           code=exitCode, **({'input': True}
+                                             if inputError else {}))
+
+        if Profiler.active:
+            Profiler.count('shifts', shifts)
+            Profiler.count('reduces', reduces)
+            Profiler.count('conflicts', conflicts)
 
         if err:
             debug_print('tree', tree)
             raise err
 
-        return tree
-
-    def _getItem(self, stack, alpha, state, token, tree):
+        return tree if buildTree else True
+
+    def _verifyReduce(self, symbols, rule):
+        """Check that symbols on stack are right side of the rule."""
+        for s1 in reversed(rule.rightSide):
+            pSymbol = symbols.pop()
+            if pSymbol != s1:
+                raise ValueError("Expecting '" + str(s1) +
+                                 "', got '" + str(pSymbol) +
+                                 "' from rule " + str(rule), 99)
+        # add rule left side to stack
+        symbols.append(rule.leftSide)
+
+    def _getItem(self, alpha, state, token, tree, conflict=False):
+        """
+        Get item of table item with conflict, solve it by tree.
+
+        alpha is one of conflicts of compiled table (only conflict cells
+        need it), returns item and whether it was just guessed
+        (nondeterministic step), tried rules are added to conflict of trace
+        if present
+        """
         grammar = self.grammar
-        item = False
-        # print(alpha.isShiftReduce, alpha.isReduceReduce)
-        if alpha.isShiftReduce or alpha.isReduceReduce:
-            if self.automat is not False:
-                # try to solve it by tree conflict
-                # reduce-reduce conflict
-                possibleRules = []
-                debug_print('rules', "conflict:")
-                for it in alpha.getReduce():
-                    rule = grammar.rules[it.state]
-                    states = tree.tryApplyRule(rule)
-                    if states is not False:
-                        debug_print('rules', "   ", rule, "\t ok")
-                        possibleRules.append((it, rule, states))
-                    else:
-                        debug_print('rules', "   ", rule, "\t no")
-
-                if len(possibleRules) > 1:
-                    # multiple options
-                    # we don't know what rule use - it is possible
-                    # that some way leads to success
-                    self.exit_code = 2
-                    options = "\n".join([str(pos[1])
-                                         for pos in possibleRules])
-                    raise ValueError("Unhandled reduce-reduce " +
-                                     "conflict in lr table on position [" +
-                                     str(state) + "," + token + "], " +
-                                     "got theese options:\n" + options)
-
-                elif len(possibleRules) == 1:
-                    # got only one option
-                    pos = possibleRules[0]
-                    if alpha.isShiftReduce:
-                        debug_print('rules', "undeterministic reduce")
-                        # we are just guessing - if there
-                        # gonna be fail in future that doesn't
-                        # mean, that string can't be in grammar
-                        self.exit_code = 2
-                    else:
-                        debug_print('rules', "deterministic reduce")
-                    tree.applyRule(pos[1], pos[2])
-                    item = pos[0]
-                else:
-                    if alpha.isShiftReduce:
-                        # if there is conflict, just shift
-                        debug_print('rules', "shift", token)
-                        item = alpha.getItem(Operation.shift)
-                        tree.pushSymbol(token)
-                    else:
-                        raise ValueError("No rule fits to tree for " +
-                                         "reduce-reduce conflict in lr " +
-                                         "table, on position [" +
-                                         str(state) + "," + token + "]")
-            elif item is False:
-                # we don't know what to do - shift-reduce conflict
-                self.exit_code = 2
-                raise ValueError("Unhandled " +
+        guessed = False
+        if self.automat is not False:
+            # try to solve it by tree conflict
+            # reduce-reduce conflict
+            possibleRules = []
+            for it in alpha.getReduce():
+                rule = grammar.rules[it.state]
+                states = tree.tryApplyRule(rule)
+                if conflict is not False:
+                    conflict['tried'].append([str(rule),
+                                              states is not False])
+                if states is not False:
+                    possibleRules.append((it, rule, states))
+
+            if len(possibleRules) > 1:
+                # multiple options
+                # we don't know what rule use - it is possible
+                # that some way leads to success
+                options = "\n".join([str(pos[1])
+                                     for pos in possibleRules])
+                raise ValueError("Unhandled reduce-reduce " +
                                  "conflict in lr table on position [" +
-                                 str(state) + "," + token + "], ")
-        else:
-            # no conflict, get operation
-            item = alpha.getItem()
-            if item.operation == Operation.shift:
-                tree.pushSymbol(token)
-                debug_print('rules', "shift", token)
+                                 str(state) + "," + token + "], " +
+                                 "got theese options:\n" + options, 2)
+
+            elif len(possibleRules) == 1:
+                # got only one option
+                pos = possibleRules[0]
+                if alpha.isShiftReduce:
+                    # we are just guessing - if there
+                    # gonna be fail in future that doesn't
+                    # mean, that string can't be in grammar
+                    guessed = True
+                    if conflict is not False:
+                        conflict['guessed'] = True
+                tree.applyRule(pos[1], pos[2])
+                item = pos[0]
             else:
-                if not tree.applyRule(grammar.rules[item.state]):
-                    raise ValueError("Rule " +
-                                     str(grammar.rules[item.state]) +
-                                     " can't be used, because " +
-                                     "of tree conflict.")
+                if alpha.isShiftReduce:
+                    # if there is conflict, just shift
+                    item = alpha.getItem(Operation.shift)
+                    tree.pushSymbol(token)
                 else:
-                    debug_print('rules', grammar.rules[item.state])
-        return item
+                    raise ValueError("No rule fits to tree for " +
+                                     "reduce-reduce conflict in lr " +
+                                     "table, on position [" +
+                                     str(state) + "," + token + "]")
+        else:
+            # without automat we don't know what to do
+            raise ValueError("Unhandled " +
+                             "conflict in lr table on position [" +
+                             str(state) + "," + token + "], ", 2)
+        return item, guessed
 
     def __str__(self):
         """To string."""
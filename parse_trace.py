@@ -0,0 +1,188 @@
+"""Trace of analysis, stream of events passed to subscribers."""
+
+import json
+from rule import Rule
+from tree import Tree
+from debug_print import Debug
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class ParseTrace:
+    """
+    Stream of analysis events.
+
+    event is dictionary with 'event' key:
+     - shift:  token and state after shift
+     - reduce: left and right side of the rule, state after reduce and
+               levels (automat state maps of levels of the new tree,
+               from its top) when there is automat
+     - accept: input belongs to grammar, tree levels were checked
+     - error:  message and exit code, input when input couldn't be read
+               after the last step
+    shift, reduce and error after conflict in lr table have conflict:
+    rules tried by tree ([rule, accepted] pairs) and whether the step
+    was just guessed
+    """
+
+    def __init__(self, *subscribers):
+        """Initialization, subscribers are called with every event."""
+        self.subscribers = list(subscribers)
+
+    def event(self, event):
+        """Pass event to subscribers."""
+        for subscriber in self.subscribers:
+            subscriber(event)
+
+    def step(self, event, state, conflict=False, **data):
+        """Pass event of analysis step, state is False if there is none."""
+        step = {'event': event}
+        if state is not False:
+            step['state'] = state
+        step.update(data)
+        if conflict:
+            step['conflict'] = conflict
+        self.event(step)
+
+    def reduce(self, rule, state, tree, conflict=False):
+        """Pass reduce, with levels of the new tree if it has automat."""
+        data = {'rule': str(rule), 'left': rule.leftSide,
+                'right': list(rule.rightSide)}
+        if tree.aut and tree.autStates:
+            data['levels'] = [sorted(tree.maps()[states].items())
+                              for states in
+                              tree.autStates[-1].levelsStates()]
+        self.step('reduce', state, conflict, **data)
+
+    def close(self):
+        """Flush and close subscribers."""
+        for subscriber in self.subscribers:
+            if hasattr(subscriber, 'close'):
+                subscriber.close()
+
+
+def debugTrace(trace=False):
+    """
+    Get trace printing activated debug prints of analysis.
+
+    events are passed to trace too, it is returned as it is if no debug
+    print of analysis is activated
+    """
+    views = [view for view in ('stack', 'rules', 'trees')
+             if Debug.isActivated(view)]
+    if not views:
+        return trace
+    debug = ParseTrace(*([trace.event] if trace else []))
+    debug.subscribers.append(TraceRenderer(views))
+    return debug
+
+
+class JSONLinesSink:
+    """Subscriber writing events to file, one JSON line per event."""
+
+    def __init__(self, output, bufferSize=256):
+        """Initialization, bufferSize - number of events written at once."""
+        self.output = output
+        self.bufferSize = bufferSize
+        self._buffer = []
+
+    def __call__(self, event):
+        """Write event."""
+        self._buffer.append(json.dumps(event))
+        if len(self._buffer) >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        """Write buffered events."""
+        if self._buffer:
+            self.output.write('\n'.join(self._buffer) + '\n')
+            self._buffer = []
+        self.output.flush()
+
+    def close(self):
+        """Write buffered events, file is left open."""
+        self.flush()
+
+
+class TraceRenderer:
+    """
+    Subscriber printing development of analysis for people.
+
+    views are the same as of debug print categories:
+     - stack: stack of symbols and states before every step
+     - rules: applied rules and shifts
+     - trees: derivation tree after every step
+     - tree:  final derivation tree (or tree at the error)
+    stack and tree are rebuilt from events, tree after step is printed
+    when the next event comes, as it isn't printed when input couldn't be
+    read after the step
+    """
+
+    def __init__(self, views, output=None):
+        """Initialization, output - file, stdout if not present."""
+        self.views = set(views)
+        self.output = output
+        self.states = [0]
+        self.symbols = ['']
+        self.tree = Tree(False, False)
+        # tree of the last step wasn't printed yet
+        self._stepDone = False
+
+    def _print(self, *args):
+        """Print to output."""
+        print(*args, file=self.output)
+
+    def __call__(self, event):
+        """Print event."""
+        kind = event['event']
+        views = self.views
+        inputError = kind == 'error' and event.get('input', False)
+        if self._stepDone and not inputError:
+            self._print(self.tree, '\n')
+        self._stepDone = False
+        if 'stack' in views and not inputError:
+            self._print(self.states[-1], "".join(
+                ["<" + symbol + "," + str(state) + ">"
+                 for symbol, state in zip(self.symbols, self.states)]))
+        conflict = event.get('conflict')
+        if conflict and 'rules' in views:
+            self._print("conflict:")
+            for rule, accepted in conflict['tried']:
+                self._print("   ", rule, "\t ok" if accepted else "\t no")
+
+        if kind == 'shift':
+            if 'rules' in views:
+                self._print("shift", event['token'])
+            self.tree.pushSymbol(event['token'])
+            self.symbols.append(event['token'])
+            self.states.append(event['state'])
+        elif kind == 'reduce':
+            rule = Rule(event['left'], event['right'])
+            if 'rules' in views:
+                if not conflict:
+                    self._print(rule)
+                elif conflict['guessed']:
+                    self._print("undeterministic reduce")
+                else:
+                    self._print("deterministic reduce")
+            self.tree.applyRule(rule)
+            if rule.rightSide:
+                del self.symbols[-len(rule.rightSide):]
+                del self.states[-len(rule.rightSide):]
+            self.symbols.append(rule.leftSide)
+            self.states.append(event['state'])
+        else:
+            if 'tree' in views:
+                self._print(self.tree, *(['\n'] if kind == 'accept' else []))
+            return
+
+        self._stepDone = 'trees' in views
+
+    def close(self):
+        """Print tree of the last step if the trace ended after it."""
+        if self._stepDone:
+            self._print(self.tree, '\n')
+            self._stepDone = False
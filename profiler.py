@@ -0,0 +1,131 @@
+"""Phase timing and counters of grammar compilation and analysis."""
+
+import time
+import tracemalloc
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class _NoPhase:
+    """Phase of inactive profiler, does nothing."""
+
+    def __enter__(self):
+        """Enter phase."""
+        return self
+
+    def __exit__(self, *exc):
+        """Leave phase."""
+        return False
+
+
+class _Phase:
+    """Measured phase, time and peak memory are added to profiler."""
+
+    def __init__(self, name):
+        """Initialization."""
+        self.name = name
+
+    def __enter__(self):
+        """Start measuring."""
+        Profiler._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        """Stop measuring."""
+        Profiler._exit(self)
+        return False
+
+
+class Profiler:
+    """
+    Profiler static class.
+
+    phases can be nested, outer phase includes time and memory of inner
+    ones, repeated phases are summed (memory is maximum of them), when
+    profiler is not active phases and counters cost almost nothing
+    """
+    active = False
+    memory = False
+    phases = {}
+    counters = {}
+    _stack = []
+    _noPhase = _NoPhase()
+
+    @classmethod
+    def activate(cls, memory=True):
+        """Start profiling from now, memory - measure peak memory too."""
+        cls.reset()
+        cls.active = True
+        cls.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def deactivate(cls):
+        """Stop profiling, collected data are kept."""
+        cls.active = False
+        if cls.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        cls.memory = False
+
+    @classmethod
+    def reset(cls):
+        """Drop collected data."""
+        cls.phases = {}
+        cls.counters = {}
+        cls._stack = []
+
+    @classmethod
+    def phase(cls, name):
+        """Get context manager measuring phase."""
+        if not cls.active:
+            return cls._noPhase
+        return _Phase(name)
+
+    @classmethod
+    def count(cls, name, n=1):
+        """Add n to counter."""
+        if cls.active:
+            cls.counters[name] = cls.counters.get(name, 0) + n
+
+    @classmethod
+    def summary(cls):
+        """Get collected data as dictionary (JSON serializable)."""
+        return {'phases': {name: dict(phase)
+                           for name, phase in cls.phases.items()},
+                'counters': dict(cls.counters)}
+
+    @classmethod
+    def _enter(cls, phase):
+        """Start phase, peak of outer phase is kept aside."""
+        phase.peak = 0
+        if cls.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if cls._stack:
+                outer = cls._stack[-1]
+                outer.peak = max(outer.peak, peak)
+            tracemalloc.reset_peak()
+            phase.startMemory = current
+        cls._stack.append(phase)
+        phase.start = time.perf_counter()
+
+    @classmethod
+    def _exit(cls, phase):
+        """Finish phase and add it to collected data."""
+        seconds = time.perf_counter() - phase.start
+        cls._stack.pop()
+        record = cls.phases.setdefault(phase.name, {'calls': 0, 'time': 0.0})
+        record['calls'] += 1
+        record['time'] += seconds
+        if cls.memory:
+            peak = max(phase.peak, tracemalloc.get_traced_memory()[1])
+            if cls._stack:
+                outer = cls._stack[-1]
+                outer.peak = max(outer.peak, peak)
+            tracemalloc.reset_peak()
+            # memory allocated by phase over what was there before, KiB
+            memory = max(0, peak - phase.startMemory) // 1024
+            record['memory'] = max(record.get('memory', 0), memory)
@@ -0,0 +1,285 @@
+"""
+Tree-Controled Grammer parser server.
+
+python3
+server.py
+-g expr=tests/test10.in -p 8080
+
+requests:
+  GET  /grammars                  - names of loaded grammars
+  POST /grammars/<name>/parse     - analyze request body by grammar,
+                                    ?tree=1 adds derivation tree
+  POST /grammars/<name>/reload    - compile grammar file again
+"""
+
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+import traceback
+import socketserver
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlsplit
+from urllib.parse import parse_qs
+from lr_table import LRTable
+from compiled_grammar import CompiledGrammar
+from grammar_cache import GrammarCache
+from batch import analyzeInput
+from debug_print import err_message
+from debug_print import err_print
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class GrammarRegistry:
+    """Compiled grammars by name, grammars can be reloaded any time."""
+
+    def __init__(self, mode='slr', cache=False, engine='lr'):
+        """Initialization."""
+        self.mode = mode
+        self.engine = engine
+        self.cache = cache
+        self._files = {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def load(self, name, path):
+        """
+        Compile grammar file and register it under name.
+
+        raises ValueError(message, exit code), previously loaded grammar
+        stays in use then
+        """
+        with open(path) as f:
+            source = f.read()
+        compiled = False
+        if self.cache:
+            compiled = self.cache.load(source, self.mode)
+        if compiled is False:
+            compiled = CompiledGrammar(source, path, self.mode)
+            if self.cache:
+                try:
+                    self.cache.store(source, self.mode, compiled)
+                except OSError as e:
+                    print("Warning: compiled grammar not cached: " +
+                          str(e), file=sys.stderr)
+        compiled.engine = self.engine
+        # requests in progress keep using the grammar they got before
+        with self._lock:
+            self._files[name] = path
+            self._compiled[name] = compiled
+
+    def reload(self, name):
+        """Compile grammar from its file again."""
+        self.load(name, self._files[name])
+
+    def get(self, name):
+        """Get compiled grammar, False if there is no such grammar."""
+        with self._lock:
+            return self._compiled.get(name, False)
+
+    def names(self):
+        """Get names of grammars."""
+        with self._lock:
+            return sorted(self._compiled)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handler of parse server requests."""
+
+    registry = False
+
+    def do_GET(self):
+        """Handle GET request."""
+        path = urlsplit(self.path).path.strip('/').split('/')
+        if path == ['grammars']:
+            self._send(200, {'grammars': self.registry.names()})
+        else:
+            self._send(404, {'error': 'Unknown request'})
+
+    def do_POST(self):
+        """Handle POST request."""
+        url = urlsplit(self.path)
+        path = url.path.strip('/').split('/')
+        # body is read only by its length, it isn't read without it
+        length = self.headers.get('Content-Length')
+        body = b''
+        if length is not None:
+            if not (length.isascii() and length.isdigit()):
+                self._send(400, {'error': 'Invalid Content-Length'})
+                return
+            body = self.rfile.read(int(length))
+
+        if len(path) != 3 or path[0] != 'grammars':
+            self._send(404, {'error': 'Unknown request'})
+            return
+        name = path[1]
+        compiled = self.registry.get(name)
+        if compiled is False:
+            self._send(404, {'error': "Unknown grammar '" + name + "'"})
+            return
+
+        if path[2] == 'parse':
+            if length is None:
+                self._send(411, {'error': 'Content-Length is required'})
+                return
+            try:
+                input = body.decode('utf-8')
+            except UnicodeDecodeError:
+                self._send(400, {'error': 'Input is not valid utf-8'})
+                return
+            query = parse_qs(url.query)
+            tree = query.get('tree', ['0'])[-1] not in ('0', '')
+            result = analyzeInput(compiled, input, '<request>', tree)
+            result['grammar'] = name
+            del result['input']
+            self._send(200, result)
+
+        elif path[2] == 'reload':
+            result = {'grammar': name, 'exit_code': 0, 'error': None}
+            try:
+                self.registry.reload(name)
+            except ValueError as e:
+                result['exit_code'] = e.args[1]
+                result['error'] = err_message(e.args[1], e.args[0])
+            except OSError as e:
+                result['exit_code'] = 10
+                result['error'] = err_message(10, str(e))
+            except Exception:
+                result['exit_code'] = 99
+                result['error'] = err_message(99, traceback.format_exc())
+            self._send(200, result)
+
+        else:
+            self._send(404, {'error': 'Unknown request'})
+
+    def _send(self, status, data):
+        """Send JSON response."""
+        body = (json.dumps(data) + '\n').encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        """Client address, unix socket clients have none."""
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return self.server.server_address
+
+    def log_message(self, format, *args):
+        """Log requests to stderr only in verbose mode."""
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn,
+                              socketserver.UnixStreamServer):
+    """HTTP server on unix socket, thread per request."""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        """Bind socket, remove old socket file first."""
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+
+
+def main():
+    """Main function."""
+    argp = argparse.ArgumentParser(
+        description='Tree controlled grammar parser server',
+        formatter_class=argparse.RawTextHelpFormatter)
+    argp.add_argument('-g', '--grammar',
+                      required=True,
+                      nargs='+',
+                      action='store',
+                      metavar='[NAME=]GRAMMAR',
+                      help='Grammar files to load, name is file name ' +
+                      'without\nextension if not present'
+                      )
+    argp.add_argument('-m', '--mode',
+                      default='slr',
+                      action='store',
+                      choices=LRTable.modes,
+                      help='LR table construction mode, slr if not present'
+                      )
+    argp.add_argument('-e', '--engine',
+                      default='lr',
+                      action='store',
+                      choices=CompiledGrammar.engines,
+                      help='Analysis engine, lr if not present'
+                      )
+    argp.add_argument('-c', '--cache-dir',
+                      default=False,
+                      action='store',
+                      help='Directory of compiled grammars, only files ' +
+                      'of\ncurrent user not writable by others are loaded'
+                      )
+    address = argp.add_mutually_exclusive_group()
+    address.add_argument('-p', '--port',
+                         default=8080,
+                         type=int,
+                         action='store',
+                         help='Port on localhost, 8080 if not present'
+                         )
+    address.add_argument('-s', '--socket',
+                         default=False,
+                         action='store',
+                         help='Listen on unix socket instead of port'
+                         )
+    argp.add_argument('-v', '--verbose',
+                      default=False,
+                      action='store_true',
+                      help='Log requests to stderr'
+                      )
+    args = argp.parse_args()
+
+    cache = GrammarCache(args.cache_dir) if args.cache_dir else False
+    registry = GrammarRegistry(args.mode, cache, args.engine)
+    for grammar in args.grammar:
+        if '=' in grammar:
+            name, path = grammar.split('=', 1)
+        else:
+            path = grammar
+            name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            registry.load(name, path)
+        except ValueError as e:
+            err_print(e.args[1], e.args[0])
+        except OSError as e:
+            err_print(10, "argument -g/--grammar: can't open '" + path +
+                      "': " + str(e))
+
+    RequestHandler.registry = registry
+    if args.socket:
+        server = ThreadingUnixHTTPServer(args.socket, RequestHandler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', args.port),
+                                     RequestHandler)
+    server.verbose = args.verbose
+    # terminate cleanly on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    sys.exit(0)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception:
+        err_print(99, traceback.format_exc())
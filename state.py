@@ -1,7 +1,5 @@
 """Finite machine state module."""
 
-import copy
-
 # -- coding: utf-8 --
 __author__ = 'stepan'
 __license__ = 'MIT'
@@ -61,9 +59,12 @@ class State:
         else:
             return []
 
+    def setRules(self, rules):
+        """Replace all rules."""
+        self._rules = rules
+
     def addNonERules(self, rules):
         """Add non epsilon rules."""
-        rules = copy.deepcopy(rules)
         for char in rules:
             if char != '':
                 for target in rules[char]:
@@ -6,21 +6,39 @@ tcgp.py
 -g tests/test10.in -i tests/input10.in
 """
 
+import os
 import sys
+import json
 import traceback
 import argparse
-from parser import Parser
 from lr_table import LRTable
-from input_parser import InputParser
+from compiled_grammar import CompiledGrammar
+from grammar_cache import GrammarCache
+from emit_module import emitModule
+from batch import batchInputs
+from batch import runBatch
+from batch import runParallel
 from debug_print import Debug
-from debug_print import debug_print
 from debug_print import err_print
+from profiler import Profiler
+from tree_format import treeFormats
+from tree_format import writeText
+from parse_trace import ParseTrace
+from parse_trace import JSONLinesSink
 
 # -- coding: utf-8 --
 __author__ = 'stepan'
 __license__ = 'MIT'
 __version__ = '1.0'
 
+# debug categories printed during grammar compilation
+buildCategories = ['grammar', 'precedence', 'automat', 'groups', 'table',
+                   'eff', 'conflicts', 'scanner']
+# debug categories printing final derivation tree
+treeCategories = ['tree'] + list(treeFormats)
+# debug categories printed during analysis of input
+analysisCategories = ['stack', 'rules', 'trees', 'all'] + treeCategories
+
 
 class ArgumentParser(argparse.ArgumentParser):
     """Redefinition of argument parser."""
@@ -29,12 +47,26 @@ class ArgumentParser(argparse.ArgumentParser):
         err_print(10, message)
 
 
-def closeFiles(opened_files):
-    """Close all opened files."""
+def closeFiles(opened_files, profile=False):
+    """Close all opened files, write profile summary first if requested."""
+    if profile:
+        json.dump(Profiler.summary(), profile, indent=2)
+        profile.write('\n')
     for f in opened_files:
         f.close()
 
 
+def printTree(tree, output):
+    """Write final derivation tree in all requested formats."""
+    if Debug.isActivated('tree'):
+        writeText(tree.stack, output)
+        # the same as print(tree, '\n')
+        output.write(" \n\n")
+    for category, write in treeFormats.items():
+        if Debug.isActivated(category):
+            write(tree.stack, output)
+
+
 def main():
     """Main function."""
     # arguments parsing
@@ -54,7 +86,8 @@ def main():
                       metavar='CHOICE',
                       choices=['tree', 'trees', 'stack', 'rules', 'groups',
                                'table', 'eff', 'automat', 'precedence',
-                               'grammar', 'scanner', 'all'],
+                               'grammar', 'scanner', 'conflicts', 'json',
+                               'sexpr', 'dot', 'levels', 'all'],
                       help="Decide what to print from these CHOICES:\n" +
                       " - tree:       final derivation tree\n" +
                       " - trees:      derivation tree development\n" +
@@ -67,13 +100,48 @@ def main():
                       " - precedence: print precedence table\n" +
                       " - grammar:    print input grammar\n" +
                       " - scanner:    print input scanner automat\n" +
+                      " - conflicts:  conflicts in slr and lalr table\n" +
+                      " - json:       final tree as JSON line\n" +
+                      " - sexpr:      final tree as s-expression\n" +
+                      " - dot:        final tree as Graphviz graph\n" +
+                      " - levels:     symbols of each level of final tree\n" +
                       " - all:        print all\n"
                       )
-    argp.add_argument('-i', '--input',
-                      default=sys.stdin,
+    inputs = argp.add_mutually_exclusive_group()
+    inputs.add_argument('-i', '--input',
+                        default=sys.stdin,
+                        action='store',
+                        type=argparse.FileType('r'),
+                        help='Input string file, <stdin> if not present'
+                        )
+    inputs.add_argument('-b', '--batch',
+                        default=False,
+                        nargs='+',
+                        action='store',
+                        metavar='INPUT',
+                        help='Analyze many input files, directories or ' +
+                        'list\nof files from <stdin> (-), print json line ' +
+                        'per file'
+                        )
+    argp.add_argument('-j', '--jobs',
+                      default=False,
                       action='store',
-                      type=argparse.FileType('r'),
-                      help='Input string file, <stdin> if not present'
+                      type=int,
+                      metavar='N',
+                      help='Number of processes analyzing inputs in ' +
+                      'batch mode,\n0 for number of CPUs, 1 if not present'
+                      )
+    argp.add_argument('--unordered',
+                      default=False,
+                      action='store_true',
+                      help='Print batch results as they come, not in ' +
+                      'order of inputs'
+                      )
+    argp.add_argument('-0', '--null',
+                      default=False,
+                      action='store_true',
+                      help='Files list on <stdin> is delimited by NUL ' +
+                      'characters'
                       )
     argp.add_argument('-o', '--output',
                       default=sys.stdout,
@@ -81,6 +149,68 @@ def main():
                       type=argparse.FileType('w'),
                       help='Output file, <stdout> if not present'
                       )
+    argp.add_argument('-m', '--mode',
+                      default='slr',
+                      action='store',
+                      choices=LRTable.modes,
+                      help='LR table construction mode, slr if not present'
+                      )
+    argp.add_argument('-e', '--engine',
+                      default='lr',
+                      action='store',
+                      choices=CompiledGrammar.engines,
+                      help='Analysis engine, lr if not present:\n' +
+                      'lr  - deterministic, conflicts not solved by tree ' +
+                      'are\n      guessed or end with NONDETERM_ERROR\n' +
+                      'glr - all alternatives of conflicts are followed ' +
+                      'at\n      once, result is certain unless ' +
+                      'derivations\n      with cycles had to be cut'
+                      )
+    argp.add_argument('--verify',
+                      default=False,
+                      action='store_true',
+                      help='Check stack symbols by every reduce, lr ' +
+                      'engine only'
+                      )
+    argp.add_argument('-c', '--cache-dir',
+                      default=False,
+                      action='store',
+                      help='Directory of compiled grammars, compiled ' +
+                      'grammar\nis loaded from it or stored to it, ' +
+                      'only files\nof current user not writable by ' +
+                      'others are\nloaded'
+                      )
+    argp.add_argument('--compile',
+                      default=False,
+                      action='store_true',
+                      help='Only compile grammar to cache directory'
+                      )
+    argp.add_argument('--emit-module',
+                      default=False,
+                      action='store',
+                      type=argparse.FileType('w'),
+                      metavar='MODULE',
+                      help='Only write standalone python module analyzing ' +
+                      'inputs\nby the grammar, lr engine only'
+                      )
+    argp.add_argument('--profile',
+                      default=False,
+                      action='store',
+                      type=argparse.FileType('w'),
+                      metavar='PROFILE',
+                      help='Write time and peak memory of phases and ' +
+                      'counters\nof analysis to file as JSON (worker ' +
+                      'processes\nof batch mode are not included)'
+                      )
+    argp.add_argument('--trace',
+                      default=False,
+                      action='store',
+                      type=argparse.FileType('w'),
+                      metavar='TRACE',
+                      help='Write events of analysis to file as JSON ' +
+                      'lines,\nthey can be printed by trace_view.py ' +
+                      '(not in\nbatch mode)'
+                      )
     argp.add_argument('-u')
 
     args = argp.parse_args()
@@ -94,86 +224,128 @@ def main():
             if category == 'all':
                 Debug.setDebugMode(True)
 
+    if args.compile and not args.cache_dir:
+        err_print(10, "argument --compile: requires --cache-dir")
+    if args.jobs is not False and args.jobs < 0:
+        err_print(10, "argument -j/--jobs: must not be negative")
+    # options of batch mode only
+    if not args.batch:
+        for option, used in (('-j/--jobs', args.jobs is not False),
+                             ('--unordered', args.unordered),
+                             ('-0/--null', args.null)):
+            if used:
+                err_print(10, "argument " + option + ": requires --batch")
+    else:
+        # batch results are json lines, nothing is printed between them
+        for category in args.print or []:
+            if category in analysisCategories:
+                err_print(10, "argument -p/--print: '" + category +
+                          "' can't be used with --batch")
+        if args.trace:
+            err_print(10, "argument --trace: can't be used with --batch")
+
+    # emitted module has lr engine only
+    if args.emit_module and args.engine == 'glr':
+        err_print(10, "argument --emit-module: can't be used with -e glr")
+    if args.verify and args.engine == 'glr':
+        err_print(10, "argument --verify: can't be used with -e glr")
+    LRTable.verify = args.verify
+
+    if args.profile:
+        Profiler.activate()
+
     opened_files = [args.input, args.output, args.grammar]
+    if args.profile:
+        opened_files.append(args.profile)
+    if args.emit_module:
+        opened_files.append(args.emit_module)
+    if args.trace:
+        opened_files.append(args.trace)
 
     # set output to output file
     sys.stdout = args.output
 
-    # parse input grammar
-    grammarParser = Parser()
+    source = args.grammar.read()
+    cache = GrammarCache(args.cache_dir) if args.cache_dir else False
+    compiled = False
 
-    try:
-        grammarParser.parse(args.grammar.read())
-    except ValueError as e:
-        # there is an syntax error in input grammar
-        # print with line number and filename
-        lineNum = grammarParser.getLine()
-        charPos = grammarParser.getPos()
-        closeFiles(opened_files)
-        err_print(e.args[1], e.args[0] +
-                  "\n(file: '" + args.grammar.name + "', line: " +
-                  str(lineNum) + ", pos: " +
-                  str(charPos) + ")")
-
-    # get grammar, automat and precednece table from parser
-    grammar = grammarParser.getGrammar()
-    debug_print('grammar', grammar, '\n')
-    automat = grammarParser.getAutomat()
-    precedence = grammarParser.getPrecedence()
-
-    if precedence is not False:
-        debug_print('precedence', precedence)
-
-    # Prepare automat
-    if automat:
-        # add new state for lowest level of the tree
-        # there can be all terminals
-        startState = automat.getStart()
-        newState = "t*"
-        automat.addState(newState)
-        automat.setTerminating(newState)
-        for term in grammar.terminals:
-            automat.addRule(startState, term, newState)
-            automat.addRule(newState, term, newState)
-
-        # determinate automat
-        automat.dropERules()
-        automat.determinate()
-
-        debug_print('automat', automat)
-
-    # lltable = ll_table.LLTable(grammar)
-    # print(lltable)
-    # exit(0)
+    # printouts of grammar compilation need fresh build
+    if cache and not any([Debug.isActivated(category)
+                          for category in buildCategories]):
+        with Profiler.phase('cache'):
+            compiled = cache.load(source, args.mode)
 
-    try:
-        # build lr table
-        table = LRTable(grammar, precedence, automat)
-    except ValueError as e:
-        # error in grammar
-        closeFiles(opened_files)
-        err_print(e.args[1], e.args[0])
+    if compiled is False:
+        try:
+            # parse grammar, build lr table, automat and scanner
+            compiled = CompiledGrammar(source, args.grammar.name, args.mode)
+        except ValueError as e:
+            # error in grammar
+            closeFiles(opened_files, args.profile)
+            err_print(e.args[1], e.args[0])
+        storeError = False
+        if cache:
+            with Profiler.phase('cache'):
+                try:
+                    cache.store(source, args.mode, compiled)
+                except OSError as e:
+                    storeError = e
+        if storeError and args.compile:
+            # caching was the only task
+            closeFiles(opened_files, args.profile)
+            err_print(10, "argument -c/--cache-dir: compiled grammar " +
+                      "can't be stored: " + str(storeError))
+        elif storeError:
+            # grammar is still usable, only next run compiles it
+            print("Warning: compiled grammar not cached: " +
+                  str(storeError), file=sys.stderr)
+
+    if args.compile:
+        closeFiles(opened_files, args.profile)
+        sys.exit(0)
+
+    compiled.engine = args.engine
 
-    # parse input string
-    scanner = InputParser(args.input.read(), grammar.terminals)
+    if args.emit_module:
+        args.emit_module.write(emitModule(
+            compiled, args.grammar.name,
+            os.path.basename(args.emit_module.name)))
+        closeFiles(opened_files, args.profile)
+        sys.exit(0)
 
-    debug_print('scanner', scanner.aut, '\n')
+    if args.batch:
+        # analyze all inputs, result of each is one json line
+        names = batchInputs(args.batch, args.null)
+        if args.jobs is False or args.jobs == 1:
+            runBatch(compiled, names, sys.stdout)
+        else:
+            runParallel(compiled, names, sys.stdout,
+                        args.jobs or os.cpu_count(), not args.unordered)
+        closeFiles(opened_files, args.profile)
+        sys.exit(0)
 
-    # analyze input symbols
+    # analyze input symbols, input file is read as tokens are needed
+    trace = ParseTrace(JSONLinesSink(args.trace)) if args.trace else False
     try:
-        tree = table.analyzeSymbols(scanner.getToken)
-        debug_print('tree', tree, '\n')
+        # without tree printout only acceptance is checked
+        try:
+            tree = compiled.analyze(args.input, args.input.name,
+                                    any([Debug.isActivated(category)
+                                         for category in treeCategories]),
+                                    trace)
+        finally:
+            if trace:
+                trace.close()
+        if tree is not True:
+            with Profiler.phase('render'):
+                printTree(tree, sys.stdout)
 
     except ValueError as e:
         # error in input string
-        lineNum = scanner.getLine()
-        charPos = scanner.getPos()
-        closeFiles(opened_files)
-        err_print(e.args[1], e.args[0] +
-                  "\n(file: '" + args.input.name + "', line: " +
-                  str(lineNum) + ", pos: " + str(charPos) + ")")
-
-    closeFiles(opened_files)
+        closeFiles(opened_files, args.profile)
+        err_print(e.args[1], e.args[0])
+
+    closeFiles(opened_files, args.profile)
     sys.exit(0)
 
 if __name__ == "__main__":
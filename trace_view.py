@@ -0,0 +1,79 @@
+"""
+Print trace of analysis written by tcgp.py --trace.
+
+python3
+trace_view.py
+trace.jsonl -p stack rules
+"""
+
+import sys
+import json
+import traceback
+import argparse
+from parse_trace import TraceRenderer
+from debug_print import err_print
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """Redefinition of argument parser."""
+    def error(self, message):
+        """Print err message."""
+        err_print(10, message)
+
+
+def main():
+    """Main function."""
+    argp = ArgumentParser(description='Print trace of analysis',
+                          formatter_class=argparse.RawTextHelpFormatter)
+
+    argp.add_argument('trace',
+                      nargs='?',
+                      default=sys.stdin,
+                      type=argparse.FileType('r'),
+                      metavar='TRACE',
+                      help='File with trace (default stdin)'
+                      )
+    argp.add_argument('-p', '--print',
+                      nargs='+',
+                      default=['tree'],
+                      choices=['stack', 'rules', 'trees', 'tree'],
+                      help='Printed views, same as debug prints of tcgp.py ' +
+                      '(default tree):\n' +
+                      'stack - stack of symbols and states\n' +
+                      'rules - applied rules and shifts\n' +
+                      'trees - tree after every step\n' +
+                      'tree  - final tree'
+                      )
+    argp.add_argument('-o', '--output',
+                      default=sys.stdout,
+                      type=argparse.FileType('w'),
+                      help='Output file (default stdout)'
+                      )
+
+    args = argp.parse_args()
+
+    renderer = TraceRenderer(args.print, args.output)
+    for num, line in enumerate(args.trace):
+        if not line.strip():
+            continue
+        try:
+            renderer(json.loads(line))
+        except (ValueError, KeyError) as e:
+            err_print(10, "Invalid trace event on line " + str(num + 1) +
+                      ": " + str(e))
+
+    renderer.close()
+    args.trace.close()
+    args.output.close()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception:
+        err_print(99, traceback.format_exc())
@@ -1,5 +1,13 @@
 """Virtual tree."""
 
+import io
+import weakref
+import threading
+from profiler import Profiler
+from tree_format import treeWidths
+from tree_format import textLevels
+from tree_format import writeText
+
 # -- coding: utf-8 --
 __author__ = 'stepan'
 __license__ = 'MIT'
@@ -66,29 +74,8 @@ class SymbolTree(str):
         return symbols
 
     def toLevels(self):
-        """Get str levels of subtree."""
-        levels = []
-        width = 0
-        lastW = 0
-        for child in self.children:
-            subLevels, w = child.toLevels()
-            width += w + 1
-            for i, level in enumerate(levels):
-                if len(subLevels) > 0:
-                    subLevel = subLevels.pop(0)
-                    levels[i] = level.ljust(lastW) + subLevel
-                else:
-                    break
-            for subLevel in subLevels:
-                levels.append("".rjust(lastW) + subLevel)
-            lastW = width
-
-        if len(self.children) == 0:
-            width = len(self.str)
-        else:
-            width -= 1
-        levels = [self.str.rjust((width + 1) // 2)] + levels
-        return levels, width
+        """Get str levels of subtree and its width."""
+        return list(textLevels([self])), treeWidths([self])[id(self)]
 
     def __eq__(self, other):
         """Check if equal."""
@@ -113,16 +100,223 @@ class SymbolTree(str):
         return self.str
 
 
+class LevelStates:
+    """
+    Effect of tree levels on automat, from one level down.
+
+    states is number of map from automat state before the level to state
+    after it (maps are kept by AutomatMaps), levels below are shared by trees
+    containing the same subtree, number is set by glr analysis, equal levels
+    get the same number (None until then)
+    """
+
+    def __init__(self, states, below, fromStart):
+        """Initialization, fromStart - start state is in states map."""
+        self.states = states
+        self.below = below
+        self.number = None
+        if below:
+            self.depth = below.depth + 1
+            self.fromStart = fromStart and below.fromStart
+        else:
+            self.depth = 1
+            self.fromStart = fromStart
+
+    def levelsStates(self):
+        """Get map numbers of this and all lower levels."""
+        levels = []
+        level = self
+        while level:
+            levels.append(level.states)
+            level = level.below
+        return levels
+
+
+class AutomatMaps:
+    """
+    Maps of automat states by symbols and maps composed from them.
+
+    maps are numbered, symbol maps first, maps composed from them are added
+    by the analysis owning this copy, levels of trees are merged and checked
+    by them (source of this class and of LevelStates is copied to emitted
+    parser modules, so they use nothing else)
+    """
+
+    def __init__(self, start, symbolStates):
+        """Number maps of symbols, symbolStates - state map by symbol."""
+        self.start = start
+        self.maps = []
+        self.fromStart = []
+        self._mapNumbers = {}
+        self._composed = {}
+        # compositions of maps, read by profiler
+        self.steps = 0
+        self.symbolMaps = {symbol: self._mapNumber(states)
+                           for symbol, states in symbolStates.items()}
+
+    def copy(self):
+        """Get maps with the same symbol maps and no compositions yet."""
+        automatMaps = object.__new__(type(self))
+        automatMaps.start = self.start
+        automatMaps.maps = list(self.maps)
+        automatMaps.fromStart = list(self.fromStart)
+        automatMaps._mapNumbers = dict(self._mapNumbers)
+        automatMaps._composed = {}
+        automatMaps.steps = 0
+        automatMaps.symbolMaps = self.symbolMaps
+        return automatMaps
+
+    def compose(self, states, nextStates):
+        """
+        Compose maps of two parts of level.
+
+        compositions of the same maps are remembered for this analysis
+        """
+        self.steps += 1
+        key = (states, nextStates)
+        composed = self._composed.get(key)
+        if composed is None:
+            nextMap = self.maps[nextStates]
+            composed = self._mapNumber(
+                {before: nextMap[after]
+                 for before, after in self.maps[states].items()
+                 if after in nextMap})
+            self._composed[key] = composed
+        return composed
+
+    def _mapNumber(self, states):
+        """Get number of map, new maps are added."""
+        key = frozenset(states.items())
+        if key not in self._mapNumbers:
+            self.maps.append(states)
+            self.fromStart.append(self.start in states)
+            self._mapNumbers[key] = len(self.maps) - 1
+        return self._mapNumbers[key]
+
+    def symbolLevels(self, symbol, leftmost):
+        """Get levels states of one symbol, False if it isn't accepted."""
+        states = self.symbolMaps[symbol]
+        if leftmost and not self.fromStart[states]:
+            return False
+        return LevelStates(states, False, self.fromStart[states])
+
+    def mergeLevels(self, children, symbol, leftmost):
+        """
+        Get levels states of tree with symbol on top of children trees.
+
+        returns False if automat doesn't accept its levels, leftmost tree
+        levels are read from start state, other trees can start in any state
+        """
+        # levels bellow the second deepest child are only in the deepest
+        # one, they are taken as they are
+        deepest = False
+        depth = 0
+        for child in children:
+            if not deepest or child.depth > deepest.depth:
+                depth = deepest.depth if deepest else 0
+                deepest = child
+            else:
+                depth = max(depth, child.depth)
+
+        maps = self.maps
+        fromStart = self.fromStart
+        levels = []
+        for child in children:
+            level = child
+            for i in range(min(child.depth, depth)):
+                if i == len(levels):
+                    # level starts in this child
+                    levels.append(level.states)
+                else:
+                    states = self.compose(levels[i], level.states)
+                    if leftmost and not fromStart[states] or \
+                            not maps[states]:
+                        return False
+                    levels[i] = states
+                level = level.below
+
+        below = False
+        if deepest:
+            below = deepest
+            for i in range(depth):
+                below = below.below
+        for states in reversed(levels):
+            below = LevelStates(states, below, fromStart[states])
+
+        # new level with rule left side on top
+        states = self.symbolMaps[symbol]
+        top = LevelStates(states, below, fromStart[states])
+        if leftmost and not top.fromStart or not maps[top.states]:
+            return False
+        return top
+
+    def failedLevel(self, levels, isTerm):
+        """
+        Get number of first level not ending in final state.
+
+        levels are states of leftmost tree, isTerm tells final states,
+        False if all levels are final
+        """
+        for i, states in enumerate(levels.levelsStates()):
+            if not isTerm(self.maps[states][self.start]):
+                return i
+        return False
+
+
+# symbol maps of automats in use, dropped with their automat
+_symbolMaps = weakref.WeakKeyDictionary()
+_symbolMapsLock = threading.Lock()
+
+
+def automatMaps(aut):
+    """
+    Get maps of automat for one analysis.
+
+    symbol maps are built once for each automat and only read afterwards,
+    compositions are kept by the copy of one analysis, so memory doesn't
+    grow with analyses served by one grammar
+    """
+    with _symbolMapsLock:
+        shared = _symbolMaps.get(aut)
+        if shared is None:
+            symbolStates = {symbol: {} for symbol in aut.getAlphabet()}
+            for state in aut.getStates():
+                for symbol, target in aut.getTransitions(state).items():
+                    symbolStates[symbol][state] = target
+            shared = AutomatMaps(aut.getStart(), symbolStates)
+            _symbolMaps[aut] = shared
+            if Profiler.active:
+                Profiler.count('automat_maps', len(shared.maps))
+    return shared.copy()
+
+
 class Tree:
-    """Composing of virtual tree from original rules."""
-    def __init__(self, aut, grammar):
+    """
+    Composing of virtual tree from original rules.
+
+    when build is not set, symbols of tree are not kept, only automat
+    states of levels needed to check the tree (acceptance only)
+    """
+    def __init__(self, aut, grammar, build=True):
         """Initialization."""
         self.aut = aut
         self.grammar = grammar
+        self.build = build
         self.stack = []
+        # first and last symbols on levels of each tree on stack,
+        # from the lowest level
+        self.levelEnds = []
         self.autStates = []
         if self.aut:
-            self._generateDict()
+            self._automatMaps = automatMaps(self.aut)
+
+    def maps(self):
+        """Get maps of automat states by their numbers."""
+        return self._automatMaps.maps
+
+    def symbolMaps(self):
+        """Get numbers of maps of symbols by symbol."""
+        return self._automatMaps.symbolMaps
 
     def _ruleSymbols(self, rule):
         # take symbols, that are in rule, from stack
@@ -134,171 +328,156 @@ class Tree:
 
     def applyRule(self, rule, autStates=False):
         """Apply rule to tree."""
-        sNew = SymbolTree(rule.leftSide)
-        # take symbols, that are in rule, from stack
-        children = self._ruleSymbols(rule)
-        treeIndex = len(self.stack) - len(rule.rightSide)
-
         if self.aut:
             if autStates is False:
-                if self.aut is not False:
-                    autStates = self.tryApplyRule(rule)
-                    if autStates is False:
-                        return False
+                autStates = self.tryApplyRule(rule)
+                if autStates is False:
+                    return False
 
-            self.autStates = self.autStates[:treeIndex]
+            del self.autStates[len(self.autStates) - len(rule.rightSide):]
             self.autStates.append(autStates)
 
-        sNew.children = self.mergeTrees(children)
+        if not self.build:
+            return True
 
-        if len(rule.rightSide) > 0:
-            # remove symbols from stack
-            self.stack = self.stack[:-len(rule.rightSide)]
+        sNew = SymbolTree(rule.leftSide)
+        # take symbols, that are in rule, from stack
+        children = self._ruleSymbols(rule)
+        treeIndex = len(self.stack) - len(rule.rightSide)
+
+        sNew.children = children
+        heads, tails = self.mergeTrees(children, self.levelEnds[treeIndex:])
+        heads.append(sNew)
+        tails.append(sNew)
+
+        # remove symbols from stack
+        del self.stack[treeIndex:]
+        del self.levelEnds[treeIndex:]
 
         self.stack.append(sNew)
+        self.levelEnds.append((heads, tails))
         return True
 
     def pushSymbol(self, symbol):
         """Push new symbol."""
         if self.aut:
-            if len(self.stack) == 0 and self.aut:
-                startSymbol = self.aut.getStart()
-            else:
-                startSymbol = False
-
-            newState = self.applyCharToState(symbol, startSymbol)
-            self.autStates.append([newState])
-            if newState is False:
+            levels = self.symbolLevels(symbol, len(self.autStates) == 0)
+            if levels is False:
                 raise ValueError("Pushed symbol '" + symbol + "' is not " +
                                  "accepted by automat.", 1)
+            self.autStates.append(levels)
+
+        if not self.build:
+            return
 
-        self.stack.append(SymbolTree(symbol))
+        sNew = SymbolTree(symbol)
+        self.stack.append(sNew)
+        self.levelEnds.append(([sNew], [sNew]))
 
     def tryApplyRule(self, rule):
-        """Try to merge trees."""
-        # copy automat states
+        """
+        Try to merge trees.
 
+        returns levels states of new tree, False if automat doesn't accept
+        its levels, levels of children are composed without going through
+        their symbols again
+        """
         if not self.aut:
             raise ValueError("Can't check tree, when there is no automat.", 99)
 
-        treeIndex = len(self.stack) - len(rule.rightSide)
-
-        firstState = False
-
-        if treeIndex == 0:
-            # we are working with leftmost tree
-            firstState = self.aut.getStart()
-
-        trees = self._ruleSymbols(rule)[1:]
-        if treeIndex == len(self.stack):
-            # epsilon rule
-            autStates = []
-        else:
-            autStates = list(self.autStates[treeIndex])
-        # check levels by automat
-        for child in trees:
-            levels = child.getFirstSymbols()
-            for i, symbol in enumerate(levels):
-                while i >= len(autStates):
-                    autStates.append(firstState)
-                # s = str(i) + ": " + str(autStates[i])
-                while symbol:
-                    # s += "'" + symbol.str + "' -> "
-                    autStates[i] =\
-                        self.applyCharToState(
-                            symbol.str, autStates[i])
-                    if autStates[i] is False:
-                        return False
-                    # s += str(autStates[i])
-                    symbol = symbol.next
-                # print(autStates)
-                # print(s)
-        # success
-        # new autStates are ok
-        newState = self.applyCharToState(rule.leftSide, firstState)
-        if newState is False or newState == set():
-            return False
-        autStates = [newState] + autStates
-        return autStates
-
-    def applyCharToState(self, char, state):
-        """Apply char to state(s) by automaton."""
-        if state is False:
-            # we don't know in which state we are - take all possible
-            return self._dict[char]
-        elif isinstance(state, type(set())):
-            # state is set of states - there is more possible states
-            # lets try all of them
-            newStates = set()
-            for st in state:
-                newState = self.aut.applyCharToState(char, st)
-                if newState is not False:
-                    newStates.add(newState)
-            if len(newStates) == 0:
-                return False
-            return newStates
-        else:
-            return self.aut.applyCharToState(char, state)
-
-    def _generateDict(self):
-        """Generate dictionary for unknown start state."""
-        self._dict = {}
-        for symbol in self.aut._alphabet:
-            self._dict[symbol] = set()
-
-        for stName in self.aut._states:
-            state = self.aut._states[stName]
-            for symbol in state._rules:
-                newStates = state._rules[symbol]
-                self._dict[symbol].update(newStates)
-
-    def mergeTrees(self, children):
-        """Connect children trees."""
+        treeIndex = len(self.autStates) - len(rule.rightSide)
+        return self.mergeLevels(self.autStates[treeIndex:], rule.leftSide,
+                                treeIndex == 0)
+
+    def symbolLevels(self, symbol, leftmost):
+        """Get levels states of one symbol, False if it isn't accepted."""
+        return self._automatMaps.symbolLevels(symbol, leftmost)
+
+    def mergeLevels(self, children, symbol, leftmost):
+        """
+        Get levels states of tree with symbol on top of children trees.
+
+        returns False if automat doesn't accept its levels, levels are
+        merged by AutomatMaps, tried rule is counted by profiler
+        """
+        maps = self._automatMaps
+        if not Profiler.active:
+            return maps.mergeLevels(children, symbol, leftmost)
+        steps, count = maps.steps, len(maps.maps)
+        levels = maps.mergeLevels(children, symbol, leftmost)
+        Profiler.count('automat_steps', maps.steps - steps)
+        Profiler.count('automat_maps', len(maps.maps) - count)
+        Profiler.count('try_apply_rule')
+        if levels is False:
+            Profiler.count('try_apply_rule_rejected')
+        return levels
+
+    def mergeTrees(self, children, ends):
+        """
+        Connect children trees levels.
+
+        ends are first and last symbols on levels of children, returns
+        the same for merged levels, lists of the deepest child are reused
+        """
         if not children:
             # empty array
-            return []
-
-        myChildren = []
-        myChildren.append(children[0])
-        lastSymbols = children[0].getLastSymbols()
-        for child in children[1:]:
-            # add child to my children
-            myChildren.append(child)
-            # connect trees levels
-            for i, newSymbol in enumerate(child.getFirstSymbols()):
-                # connect last symbols with first
-                if i < len(lastSymbols):
-                    lastSymbols[i].next = newSymbol
+            return [], []
+
+        deepest = 0
+        for i, (heads, tails) in enumerate(ends):
+            if len(heads) > len(ends[deepest][0]):
+                deepest = i
+        heads, tails = ends[deepest]
+        depth = len(heads)
+
+        # connect levels of children left to the deepest one,
+        # lists from the top level
+        leftHeads = []
+        leftTails = []
+        for childHeads, childTails in ends[:deepest]:
+            childDepth = len(childHeads)
+            for i in range(childDepth):
+                head = childHeads[childDepth - 1 - i]
+                if i < len(leftTails):
+                    leftTails[i].next = head
                 else:
-                    lastSymbols.append(newSymbol)
-
-            for i, symbol in enumerate(lastSymbols):
-                # move to last symbols on each level
-                lastSymbols[i] = symbol.getLastOnLevel()
-        return myChildren
+                    leftHeads.append(head)
+                    leftTails.append(head)
+                leftTails[i] = childTails[childDepth - 1 - i]
+        for i, head in enumerate(leftHeads):
+            leftTails[i].next = heads[depth - 1 - i]
+            heads[depth - 1 - i] = head
+
+        # connect levels of children right to the deepest one
+        for childHeads, childTails in ends[deepest + 1:]:
+            childDepth = len(childHeads)
+            for i in range(childDepth):
+                tails[depth - 1 - i].next = childHeads[childDepth - 1 - i]
+                tails[depth - 1 - i] = childTails[childDepth - 1 - i]
+        return heads, tails
 
     def checkTree(self):
         """Check if all levels states are in terminating state."""
         if self.aut and self.autStates:
-            for i, state in enumerate(self.autStates[0]):
-                if not self.aut.isTerm(state):
-                    raise ValueError('Level ' + str(i) +
-                                     ' is not in final state.', 1)
+            level = self.failedLevel(self.autStates[0])
+            if level is not False:
+                raise ValueError('Level ' + str(level) +
+                                 ' is not in final state.', 1)
         return True
 
+    def failedLevel(self, levels):
+        """
+        Get number of first level not ending in final state.
+
+        levels are states of leftmost tree, False if all levels are final
+        """
+        return self._automatMaps.failedLevel(levels, self.aut.isTerm)
+
     def __str__(self):
         """To string."""
-        levels = []
-        lastW = 0
-        for symbol in self.stack:
-            subLevels, w = symbol.toLevels()
-            for i, subLev in enumerate(subLevels):
-                if i >= len(levels):
-                    levels.append("")
-                levels[i] = levels[i].ljust(lastW) + subLev
-            lastW += w + 2
-
-        return "\n".join([level for level in levels])
+        output = io.StringIO()
+        writeText(self.stack, output)
+        return output.getvalue()
 
     def strWithBug(self, bug):
         """To string with printed bug from check tree function."""
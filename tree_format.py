@@ -0,0 +1,192 @@
+"""Output formats of derivation tree, written without recursion."""
+
+import json
+
+# -- coding: utf-8 --
+__author__ = 'stepan'
+__license__ = 'MIT'
+__version__ = '1.0'
+
+# characters which can't be in bare atom of s-expression
+sexprSpecial = set(' \t\n\r()";\'\\')
+
+
+def treeWidths(roots):
+    """Get widths of subtrees drawn by writeText, by id of symbol."""
+    widths = {}
+    stack = [(root, False) for root in roots]
+    while stack:
+        symbol, childrenDone = stack.pop()
+        children = symbol.children
+        if not children:
+            widths[id(symbol)] = len(symbol.str)
+        elif childrenDone:
+            widths[id(symbol)] = sum([widths[id(child)]
+                                      for child in children]) + \
+                len(children) - 1
+        else:
+            stack.append((symbol, True))
+            stack.extend([(child, False) for child in children])
+    return widths
+
+
+def textLevels(roots, space=2):
+    """
+    Generate lines of drawn trees, one per level.
+
+    roots are drawn side by side with space between them, symbol is
+    centered above its children, children are separated by one space,
+    if line is already longer than where subtree should start, the subtree
+    starts after it on that line
+    """
+    widths = treeWidths(roots)
+    # where subtrees start when no line is longer, parents of symbols
+    columns = {}
+    parents = {}
+    column = 0
+    for root in roots:
+        columns[id(root)] = column
+        parents[id(root)] = None
+        column += widths[id(root)] + space
+
+    level = list(roots)
+    depth = 0
+    while level:
+        parts = []
+        length = 0
+        # shifts of subtrees on this line against their columns, as
+        # (depth of subtree, shift), growing to the current symbol
+        shifts = []
+        previous = None
+        for symbol in level:
+            if previous is not None:
+                # find subtree containing symbol and not previous one,
+                # it starts where previous symbol ends if it is further
+                first = symbol
+                top = depth
+                while parents[id(previous)] is not parents[id(first)]:
+                    previous = parents[id(previous)]
+                    first = parents[id(first)]
+                    top -= 1
+                while shifts and shifts[-1][0] >= top:
+                    shifts.pop()
+                shift = length - columns[id(first)]
+                if shift > (shifts[-1][1] if shifts else 0):
+                    shifts.append((top, shift))
+            start = columns[id(symbol)] + (shifts[-1][1] if shifts else 0)
+            text = symbol.str.rjust((widths[id(symbol)] + 1) // 2)
+            parts.append(" " * (start - length) + text)
+            length = start + len(text)
+            previous = symbol
+        yield "".join(parts)
+
+        below = []
+        for symbol in level:
+            column = columns[id(symbol)]
+            for child in symbol.children:
+                columns[id(child)] = column
+                parents[id(child)] = symbol
+                column += widths[id(child)] + 1
+                below.append(child)
+        level = below
+        depth += 1
+
+
+def writeText(roots, output, space=2):
+    """Write drawn trees, levels are separated by new line."""
+    for i, line in enumerate(textLevels(roots, space)):
+        if i:
+            output.write("\n")
+        output.write(line)
+
+
+def writeJSON(roots, output):
+    """
+    Write trees as JSON, one line per tree.
+
+    tree is object with symbols in preorder and number of parent of each
+    symbol in it (-1 for root), flat so that deep trees can be read by
+    any JSON parser
+    """
+    for root in roots:
+        symbols = []
+        parents = []
+        stack = [(root, -1)]
+        while stack:
+            symbol, parent = stack.pop()
+            number = len(symbols)
+            symbols.append(symbol.str)
+            parents.append(parent)
+            stack.extend([(child, number)
+                          for child in reversed(symbol.children)])
+        output.write(json.dumps({'symbols': symbols, 'parents': parents},
+                                separators=(',', ':')) + "\n")
+
+
+def sexprAtom(symbol):
+    """Get symbol as atom of s-expression, quoted if needed."""
+    if symbol and not sexprSpecial.intersection(symbol):
+        return symbol
+    return '"' + symbol.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def writeSExpr(roots, output):
+    """
+    Write trees as s-expressions, one line per tree.
+
+    symbol with children is (symbol child ...), symbol without them is atom
+    """
+    for root in roots:
+        stack = [root]
+        while stack:
+            symbol = stack.pop()
+            if symbol is False:
+                output.write(')')
+            elif isinstance(symbol, tuple):
+                output.write(symbol[0])
+            elif not symbol.children:
+                output.write(sexprAtom(symbol.str))
+            else:
+                output.write('(' + sexprAtom(symbol.str))
+                stack.append(False)
+                for child in reversed(symbol.children):
+                    stack.append(child)
+                    stack.append((' ',))
+        output.write("\n")
+
+
+def writeDot(roots, output):
+    """Write trees as one Graphviz graph, children are kept in order."""
+    output.write("digraph tree {\n  ordering=out;\n")
+    number = 0
+    stack = [(root, False) for root in reversed(roots)]
+    while stack:
+        symbol, parent = stack.pop()
+        node = "n" + str(number)
+        number += 1
+        output.write("  " + node + " [label=" +
+                     json.dumps(symbol.str, ensure_ascii=False) + "];\n")
+        if parent:
+            output.write("  " + parent + " -> " + node + ";\n")
+        stack.extend([(child, node) for child in reversed(symbol.children)])
+    output.write("}\n")
+
+
+def writeLevels(roots, output):
+    """Write symbols of each level of trees, as control automat reads them."""
+    level = list(roots)
+    depth = 0
+    while level:
+        output.write(str(depth) + ": " +
+                     " ".join([symbol.str for symbol in level]) + "\n")
+        level = [child for symbol in level for child in symbol.children]
+        depth += 1
+
+
+# formats of final derivation tree, by choice of print option
+treeFormats = {
+    'json': writeJSON,
+    'sexpr': writeSExpr,
+    'dot': writeDot,
+    'levels': writeLevels,
+}